@@ -0,0 +1,10 @@
+import os
+
+# gunicorn config used by ``python -m Benchmarks.run --mode gunicorn``: every
+# worker gets the deterministic model stubs instead of the real models.
+
+
+def post_worker_init(worker):
+    import app
+    from Benchmarks import stubs
+    stubs.install(app, int(os.environ['BENCH_PRODUCTS']))
@@ -0,0 +1,296 @@
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+from pathlib import Path
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Load test for the read/write endpoints against a synthetic catalog.
+#
+#   cd backend && python -m Benchmarks.run --products 100000 --concurrency 16
+#
+# The catalog is generated once per size into Benchmarks/data and copied for
+# each run (swipes write to it). Requests go through the Flask test client
+# (in-process, no network) and/or a real gunicorn server; the models are
+# replaced by the deterministic stubs in Benchmarks/stubs.py. Results are
+# written as JSON (p50/p95/p99 latency, throughput, status codes per endpoint)
+# so runs can be diffed.
+
+BENCH_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCH_DIR.parent
+ENDPOINTS = ('recommendations', 'search', 'similar', 'categories', 'swipe')
+SEARCH_TERMS = ['dress', 'legging', 'black', 'seamless', 'linen', 'crop', 'hoodie', 'jeans', 'satin', 'mini',
+                'oversized', 'puffer', 'airlift', 'drss', 'leging']
+
+
+def build_catalog(args):
+    """Generate (or reuse) the synthetic catalog and return a fresh working copy."""
+    data_dir = BENCH_DIR / 'data'
+    data_dir.mkdir(exist_ok=True)
+    base = data_dir / f'catalog_{args.products}_{args.users}_{args.swipes}_s{args.seed}.db'
+    if args.regenerate and base.exists():
+        base.unlink()
+    if not base.exists():
+        # init_db creates the schema, triggers and indexes in the file APP_DB_PATH names
+        subprocess.run([sys.executable, '-c', 'import app\nwith app.app.app_context(): app.init_db()'], cwd=BACKEND_DIR, check=True,
+                       env=dict(os.environ, APP_DB_PATH=str(base), WARMUP_MODELS='0'))
+        from Benchmarks import synthetic
+        synthetic.populate(base, args.products, n_users=args.users, n_swipes=args.swipes, seed=args.seed)
+        conn = sqlite3.connect(str(base))
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('ANALYZE')
+        conn.close()
+    work = data_dir / 'run.db'
+    for suffix in ('', '-wal', '-shm'):
+        Path(str(work) + suffix).unlink(missing_ok=True)
+    shutil.copyfile(base, work)
+    return work
+
+
+def request_plan(endpoint, n, n_products, n_users, seed):
+    """Deterministic list of ``(method, path, params, json_body)`` for one endpoint."""
+    rng = np.random.default_rng(seed)
+    from Benchmarks.synthetic import CATEGORIES, COLORS, LOCATIONS
+    plan = []
+    for _ in range(n):
+        if endpoint == 'recommendations':
+            params = {}
+            if rng.random() < 0.3:
+                params['user_id'] = f'user{rng.integers(n_users)}'
+            if rng.random() < 0.5:
+                params['category'] = CATEGORIES[rng.integers(len(CATEGORIES))][0]
+            if rng.random() < 0.3:
+                params['color'] = COLORS[rng.integers(len(COLORS))]
+            if rng.random() < 0.2:
+                params['max_price'] = int(rng.integers(30, 200))
+            plan.append(('GET', '/recommendations', params, None))
+        elif endpoint == 'search':
+            params = {'k': 24}
+            if rng.random() < 0.8:
+                params['q'] = SEARCH_TERMS[rng.integers(len(SEARCH_TERMS))]
+            if rng.random() < 0.3:
+                params['location'] = LOCATIONS[rng.integers(len(LOCATIONS))]
+            if rng.random() < 0.3:
+                params['min_price'] = int(rng.integers(10, 80))
+            plan.append(('GET', '/search', params, None))
+        elif endpoint == 'similar':
+            plan.append(('GET', '/similar', {'product_id': int(rng.integers(1, n_products + 1))}, None))
+        elif endpoint == 'categories':
+            plan.append(('GET', '/categories', {}, None))
+        elif endpoint == 'swipe':
+            item = int(rng.integers(1, n_products + 1))
+            plan.append(('POST', '/swipe', {}, {
+                'action': 'like' if rng.random() < 0.6 else 'dislike', 'item_id': item,
+                'user_id': f'user{rng.integers(n_users)}', 'image': f'https://img.example.com/p/{item}.jpg'}))
+    return plan
+
+
+class ClientDriver:
+    """Runs requests in-process through Flask's test client (one per thread)."""
+
+    def __init__(self, app_module):
+        self.app = app_module.app
+        self._local = threading.local()
+
+    def __call__(self, method, path, params, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        if method == 'POST':
+            return client.post(path, json=body).status_code
+        return client.get(path, query_string=params).status_code
+
+
+class HTTPDriver:
+    """Runs requests against a live server over HTTP."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url
+        self.timeout = timeout
+
+    def __call__(self, method, path, params, body):
+        from urllib.parse import urlencode
+        url = self.base_url + path + ('?' + urlencode(params) if params else '')
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(url, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def measure(driver, plan, concurrency):
+    """Send ``plan`` with ``concurrency`` workers; return latency/throughput stats."""
+    latencies = np.zeros(len(plan))
+    statuses = [None] * len(plan)
+
+    def one(i):
+        method, path, params, body = plan[i]
+        started = time.perf_counter()
+        try:
+            statuses[i] = driver(method, path, params, body)
+        except Exception as e:
+            statuses[i] = type(e).__name__
+        latencies[i] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(len(plan))))
+    elapsed = time.perf_counter() - started
+    codes = {}
+    for s in statuses:
+        codes[str(s)] = codes.get(str(s), 0) + 1
+    errors = sum(n for code, n in codes.items() if not code.startswith(('2', '3')))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(plan) else (0, 0, 0)
+    return {
+        'requests': len(plan),
+        'errors': errors,
+        'status': codes,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(plan) / elapsed, 1) if elapsed else None,
+        'latency_ms': {'p50': round(float(p50), 2), 'p95': round(float(p95), 2), 'p99': round(float(p99), 2),
+                       'mean': round(float(latencies.mean()), 2) if len(plan) else 0,
+                       'max': round(float(latencies.max()), 2) if len(plan) else 0},
+    }
+
+
+def run_endpoints(driver, args, log):
+    results = {}
+    for offset, endpoint in enumerate(args.endpoints):
+        seed = args.seed + 100 * offset
+        if args.warmup:
+            measure(driver, request_plan(endpoint, args.warmup, args.products, args.users, seed + 1), args.concurrency)
+        results[endpoint] = measure(driver, request_plan(endpoint, args.requests, args.products, args.users, seed),
+                                    args.concurrency)
+        lat = results[endpoint]['latency_ms']
+        log(f'  {endpoint:<16} p50 {lat["p50"]:>8.2f}ms  p95 {lat["p95"]:>8.2f}ms  p99 {lat["p99"]:>8.2f}ms  '
+            f'{results[endpoint]["throughput_rps"]} req/s  errors {results[endpoint]["errors"]}')
+    return results
+
+
+def run_client(db_path, args, log):
+    # the app reads APP_DB_PATH at import time
+    os.environ['APP_DB_PATH'] = str(db_path)
+    os.environ['WARMUP_MODELS'] = '0'
+    import app
+    from Benchmarks import stubs
+    stubs.install(app, args.products)
+    results = run_endpoints(ClientDriver(app), args, log)
+    # let queued swipes (and their follow-ups) finish before the interpreter exits
+    app.swipe_writer.drain()
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def run_gunicorn(db_path, args, log):
+    port = args.port or _free_port()
+    env = dict(os.environ, APP_DB_PATH=str(db_path), WARMUP_MODELS='0', BENCH_PRODUCTS=str(args.products))
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', str(BENCH_DIR / 'gunicorn_conf.py'),
+           '-w', str(args.workers), '--threads', str(args.threads), '-b', f'127.0.0.1:{port}', 'app:app']
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env)
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.time() + 60
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f'gunicorn exited with {proc.returncode}')
+            try:
+                urllib.request.urlopen(base_url + '/ready', timeout=2).read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if time.time() > deadline:
+                    raise RuntimeError('gunicorn did not become ready within 60s')
+                time.sleep(0.2)
+        return run_endpoints(HTTPDriver(base_url), args, log)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def _git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the API against a synthetic catalog.')
+    parser.add_argument('--products', type=int, default=10000, help='catalog size (10k..1M)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--swipes', type=int, default=None, help='swipe history size (default: = products)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=500, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=50, help='unmeasured requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--mode', default='client', help='client, gunicorn or client,gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--no-response-cache', action='store_true', help='run with RESPONSE_CACHE_SIZE=0')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the cached synthetic catalog')
+    parser.add_argument('--out', default=None, help='result JSON (default: Benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args(argv)
+    args.swipes = args.products if args.swipes is None else args.swipes
+    args.endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f'unknown endpoints: {", ".join(sorted(unknown))}')
+    modes = [m.strip() for m in args.mode.split(',') if m.strip()]
+    if args.no_response_cache:
+        os.environ['RESPONSE_CACHE_SIZE'] = '0'
+
+    db_path = build_catalog(args)
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_rev': _git_rev(),
+            'products': args.products, 'users': args.users, 'swipes': args.swipes, 'seed': args.seed,
+            'requests': args.requests, 'warmup': args.warmup, 'concurrency': args.concurrency,
+            'response_cache': not args.no_response_cache,
+            'stub_latency_ms': float(os.getenv('BENCH_STUB_LATENCY_MS', '0')),
+            'python': sys.version.split()[0],
+        },
+        'results': {},
+    }
+    for mode in modes:
+        print(f'{mode}: {args.products} products, concurrency {args.concurrency}')
+        if mode == 'client':
+            report['results']['client'] = run_client(db_path, args, print)
+        elif mode == 'gunicorn':
+            report['meta'].update(gunicorn_workers=args.workers, gunicorn_threads=args.threads)
+            # a fresh copy so the client run's swipes don't carry over
+            db_path = build_catalog(args) if 'client' in modes else db_path
+            report['results']['gunicorn'] = run_gunicorn(db_path, args, print)
+        else:
+            parser.error(f'unknown mode: {mode}')
+
+    out = Path(args.out) if args.out else BENCH_DIR / 'results' / f'{datetime.now():%Y%m%d-%H%M%S}.json'
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f'Wrote {out}')
+    return report
+
+
+if __name__ == '__main__':
+    main()
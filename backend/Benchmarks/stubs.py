@@ -0,0 +1,59 @@
+import os
+import time
+import hashlib
+import numpy as np
+
+# Deterministic stand-ins for the image and NLP recommenders so benchmarks run
+# offline (no TensorFlow, no image downloads, no sentence-transformers). They
+# expose the same methods app.py calls; results depend only on the query, and
+# BENCH_STUB_LATENCY_MS adds a fixed delay to mimic model cost.
+STUB_LATENCY_MS = float(os.getenv('BENCH_STUB_LATENCY_MS', '0'))
+
+
+def _rng(text):
+    return np.random.default_rng(int.from_bytes(hashlib.sha1(text.encode('utf-8')).digest()[:8], 'little'))
+
+
+def _delay():
+    if STUB_LATENCY_MS:
+        time.sleep(STUB_LATENCY_MS / 1000.0)
+
+
+class ImageStub:
+    """Mimics Models.image_based_recommendation."""
+
+    def __init__(self, n_products):
+        self.n_products = n_products
+
+    def recommend_from_image(self, query_img_url, top_k=5):
+        _delay()
+        ids = _rng(query_img_url or '').integers(1, self.n_products + 1, size=top_k)
+        return [{'product_id': int(i), 'name': '', 'image_url': ''} for i in ids]
+
+    def query_cache_stats(self):
+        return {}
+
+
+class NLPStub:
+    """Mimics Models.nlp_recommender.NLPRecommender."""
+
+    generation = 1
+    query_cache_hits = 0
+    query_cache_misses = 0
+
+    def __init__(self, n_products):
+        self.n_products = n_products
+
+    def refresh(self, force=False):
+        return False
+
+    def nlp_recommend(self, query, top_k=5, **kwargs):
+        _delay()
+        ids = _rng(query or '').integers(1, self.n_products + 1, size=top_k)
+        return [{'id': int(i)} for i in ids]
+
+
+def install(app_module, n_products):
+    """Point the app's lazy model slots at the stubs."""
+    app_module.image_model.set(ImageStub(n_products))
+    app_module.nlp_model.set(NLPStub(n_products))
@@ -0,0 +1,99 @@
+import time
+import sqlite3
+import numpy as np
+
+# Synthetic catalogs and swipe histories for the benchmark suite. Category
+# frequencies and per-category price ranges are loosely modelled on the
+# retailer datasets in backend/Datasets; everything is seeded so two runs
+# with the same arguments produce the same database.
+
+# (category, relative frequency, median price)
+CATEGORIES = [
+    ('dress', 18, 70), ('top', 14, 40), ('legging', 9, 90), ('bra', 8, 55), ('tee', 8, 35),
+    ('skirt', 6, 55), ('shorts', 6, 45), ('trouser', 5, 85), ('hoodie', 4, 80), ('jacket', 4, 140),
+    ('sweater', 3, 75), ('jeans', 3, 90), ('coat', 2, 220), ('bikini', 2, 60), ('tank', 2, 30),
+    ('jumpsuit', 1.5, 95), ('cardigan', 1.5, 70), ('blazer', 1, 150), ('romper', 1, 65), ('puffer', 0.5, 200),
+]
+COLORS = ['Black', 'White', 'Navy', 'Grey', 'Beige', 'Brown', 'Olive', 'Pink', 'Red', 'Blue',
+          'Green', 'Cream', 'Lilac', 'Espresso', 'Teal']
+COLOR_WEIGHTS = np.array([20, 12, 8, 8, 7, 6, 5, 5, 5, 5, 4, 4, 3, 2, 2], dtype=float)
+LOCATIONS = ['US', 'UK', 'AU', 'EU', 'CA']
+LOCATION_WEIGHTS = np.array([45, 20, 15, 12, 8], dtype=float)
+GENDERS = ['women', 'men', 'unisex']
+GENDER_WEIGHTS = np.array([70, 20, 10], dtype=float)
+ADJECTIVES = ['Airlift', 'Halo', 'Essential', 'Seamless', 'Ribbed', 'Oversized', 'Cropped', 'Relaxed',
+              'High-Waist', 'Linen', 'Knit', 'Satin', 'Denim', 'Wrap', 'Utility', 'Pleated', 'Cargo', 'Mini',
+              'Midi', 'Maxi', 'Fleece', 'Performance', 'Classic', 'Vintage', 'Sculpt']
+
+
+def _weights(w):
+    w = np.asarray(w, dtype=float)
+    return w / w.sum()
+
+
+def generate_products(n, seed=0, batch_size=50000):
+    """Yield lists of product tuples (id, name, price, image, category, color, location, price_num, gender)."""
+    rng = np.random.default_rng(seed)
+    cat_names = [c[0] for c in CATEGORIES]
+    cat_p = _weights([c[1] for c in CATEGORIES])
+    medians = np.array([c[2] for c in CATEGORIES], dtype=float)
+    next_id = 1
+    while next_id <= n:
+        m = min(batch_size, n - next_id + 1)
+        cats = rng.choice(len(cat_names), size=m, p=cat_p)
+        # prices are right-skewed around the category median, rounded to x.95/x.00
+        prices = np.round(medians[cats] * rng.lognormal(0, 0.35, size=m))
+        prices = np.where(rng.random(m) < 0.5, prices - 0.05, prices).clip(5)
+        colors = rng.choice(len(COLORS), size=m, p=_weights(COLOR_WEIGHTS))
+        locations = rng.choice(len(LOCATIONS), size=m, p=_weights(LOCATION_WEIGHTS))
+        genders = rng.choice(len(GENDERS), size=m, p=_weights(GENDER_WEIGHTS))
+        adjectives = rng.integers(0, len(ADJECTIVES), size=(m, 2))
+        batch = []
+        for i in range(m):
+            pid = next_id + i
+            cat = cat_names[cats[i]]
+            color = COLORS[colors[i]]
+            name = f'{ADJECTIVES[adjectives[i, 0]]} {ADJECTIVES[adjectives[i, 1]]} {cat.title()} - {color}'
+            price_num = float(prices[i])
+            batch.append((pid, name, f'${price_num:.2f}', f'https://img.example.com/p/{pid}.jpg', cat, color,
+                          LOCATIONS[locations[i]], price_num, GENDERS[genders[i]]))
+        yield batch
+        next_id += m
+
+
+def generate_swipes(n_products, n_users, n_swipes, seed=0, like_rate=0.6):
+    """Swipe rows (item_id, action, user_id, item_image); item popularity is Zipf-like."""
+    rng = np.random.default_rng(seed + 1)
+    items = np.minimum(rng.zipf(1.3, size=n_swipes), n_products)
+    # scatter popular ranks across the id space instead of always ids 1..k
+    items = (items * 7919) % n_products + 1
+    users = rng.integers(0, n_users, size=n_swipes)
+    likes = rng.random(n_swipes) < like_rate
+    return [(int(i), 'like' if liked else 'dislike', f'user{u}', f'https://img.example.com/p/{int(i)}.jpg')
+            for i, u, liked in zip(items, users, likes)]
+
+
+def populate(db_path, n_products, n_users=1000, n_swipes=None, seed=0, log=print):
+    """Fill a database initialized by app.init_db with a synthetic catalog and swipe history."""
+    n_swipes = n_products if n_swipes is None else n_swipes
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    started = time.time()
+    with conn:
+        # drop whatever init_db seeded from data/products.json; ids start at 1
+        conn.execute('DELETE FROM products')
+        written = 0
+        for batch in generate_products(n_products, seed=seed):
+            # the category doubles as the inferred one (names contain it); gender is drawn, not inferred
+            conn.executemany('''INSERT INTO products(id, name, price, image, category, color, location, price_num, gender,
+                                                     inferred_category)
+                                VALUES (?,?,?,?,?,?,?,?,?,?)''', [row + (row[4],) for row in batch])
+            written += len(batch)
+            log(f'products: {written}/{n_products} ({written / max(time.time() - started, 1e-6):.0f} rows/s)')
+        conn.executemany('INSERT OR IGNORE INTO users(id, name) VALUES (?, ?)',
+                         [(f'user{u}', f'User {u}') for u in range(n_users)])
+        conn.executemany('INSERT INTO swipes(item_id, action, user_id, item_image) VALUES (?,?,?,?)',
+                         generate_swipes(n_products, n_users, n_swipes, seed=seed))
+    log(f'swipes: {n_swipes} for {n_users} users; catalog ready in {time.time() - started:.1f}s')
+    conn.close()
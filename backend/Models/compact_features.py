@@ -0,0 +1,334 @@
+"""Compact image embeddings for the VGG16 feature store.
+
+The raw store holds flattened 7x7x512 VGG16 activations (25,088 float32 per
+product). This module derives a much smaller search matrix from it:
+
+* ``pool``      global average pooling over the 7x7 grid (512 dims)
+* ``pca``       PCA projection of the full vector down to ``dims``
+* ``pool+pca``  pooling followed by PCA down to ``dims``
+
+stored as float16 or int8 (per-row scale), memory-mapped next to
+``all_features.npy``. Queries scan the compact matrix, then re-rank the best
+candidates against the full vectors so the final order matches exact search
+as closely as possible.
+
+Build and evaluate from the backend directory::
+
+    python -m Models.compact_features report --dims 64 128 256 512
+    python -m Models.compact_features build --method pca --dims 256 --dtype float16
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURES_PATH = os.path.join(BASE_DIR, "../Models/all_features.npy")
+COMPACT_PATH = os.path.join(BASE_DIR, "../Models/all_features_compact.npy")
+COMPACT_META_PATH = os.path.join(BASE_DIR, "../Models/all_features_compact.meta.npz")
+
+VGG_GRID = (7, 7, 512)
+METHODS = ('pool', 'pca', 'pool+pca')
+
+
+def _normalize_rows(x):
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def _pool(x):
+    x = np.asarray(x, dtype=np.float32)
+    if x.shape[-1] != int(np.prod(VGG_GRID)):
+        raise ValueError(f"pooling expects {int(np.prod(VGG_GRID))}-dim VGG16 features, got {x.shape[-1]}")
+    return x.reshape(x.shape[:-1] + VGG_GRID).mean(axis=(-3, -2))
+
+
+def _iter_blocks(features, block=1024):
+    for start in range(0, len(features), block):
+        yield start, np.asarray(features[start:start + block], dtype=np.float32)
+
+
+class Projection:
+    """Maps full feature vectors to the compact space."""
+
+    def __init__(self, method, mean=None, components=None):
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+        self.method = method
+        self.mean = mean
+        self.components = components
+
+    @property
+    def dims(self):
+        if self.components is not None:
+            return self.components.shape[0]
+        return VGG_GRID[2]
+
+    @classmethod
+    def fit(cls, features, method='pca', dims=256, sample=2000, seed=0):
+        if method == 'pool':
+            return cls(method)
+        rng = np.random.default_rng(seed)
+        n = len(features)
+        rows = np.sort(rng.choice(n, size=min(n, sample), replace=False))
+        x = np.asarray(features[rows], dtype=np.float32)
+        if method == 'pool+pca':
+            x = _pool(x)
+        mean = x.mean(axis=0)
+        xc = x - mean
+        # PCA through the (sample x sample) Gram matrix: cheap when the
+        # feature dimension is far larger than the sample
+        gram = xc @ xc.T
+        evals, evecs = np.linalg.eigh(gram)
+        order = np.argsort(evals)[::-1][:dims]
+        evals = np.clip(evals[order], 1e-12, None)
+        components = (xc.T @ evecs[:, order]) / np.sqrt(evals)
+        return cls(method, mean.astype(np.float32), components.T.astype(np.float32))
+
+    def transform(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        if self.method in ('pool', 'pool+pca'):
+            x = _pool(x)
+        if self.components is not None:
+            x = (x - self.mean) @ self.components.T
+        return _normalize_rows(x)
+
+
+def quantize(x, dtype):
+    """Returns (stored matrix, per-row scales or None)."""
+    if dtype == 'float16':
+        return x.astype(np.float16), None
+    if dtype == 'int8':
+        scale = np.abs(x).max(axis=1) / 127.0
+        scale[scale == 0] = 1.0
+        q = np.round(x / scale[:, None]).astype(np.int8)
+        return q, scale.astype(np.float32)
+    if dtype == 'float32':
+        return x.astype(np.float32), None
+    raise ValueError(f"unsupported dtype {dtype!r}")
+
+
+def compact_matrix(features, projection, dtype):
+    out, scales = [], []
+    for _, block in _iter_blocks(features):
+        q, s = quantize(projection.transform(block), dtype)
+        out.append(q)
+        if s is not None:
+            scales.append(s)
+    return np.vstack(out), (np.concatenate(scales) if scales else None)
+
+
+def _source_signature(path):
+    st = os.stat(path)
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+
+def build_compact_store(method='pca', dims=256, dtype='float16', features_path=FEATURES_PATH,
+                        compact_path=COMPACT_PATH, meta_path=COMPACT_META_PATH):
+    """Fit the projection on the current feature store and write the compact files."""
+    features = np.load(features_path, mmap_mode='r')
+    projection = Projection.fit(features, method=method, dims=dims)
+    matrix, scales = compact_matrix(features, projection, dtype)
+    tmp_path = f"{compact_path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, matrix)
+    meta = {
+        'method': np.array(method),
+        'dtype': np.array(dtype),
+        'source': _source_signature(features_path),
+    }
+    if projection.components is not None:
+        meta['mean'] = projection.mean
+        meta['components'] = projection.components
+    if scales is not None:
+        meta['scales'] = scales
+    tmp_meta = f"{meta_path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_meta, **meta)
+    os.replace(tmp_meta, meta_path)
+    os.replace(tmp_path, compact_path)
+    print(f"Wrote {matrix.shape[0]}x{matrix.shape[1]} {dtype} compact features ({method}) to {compact_path}")
+    return matrix.shape
+
+
+def rebuild_if_present(features_path=FEATURES_PATH):
+    """Refit the compact store with its previous settings, if one exists."""
+    if not os.path.exists(COMPACT_META_PATH):
+        return None
+    with np.load(COMPACT_META_PATH) as meta:
+        method = str(meta['method'])
+        dtype = str(meta['dtype'])
+        dims = meta['components'].shape[0] if 'components' in meta.files else VGG_GRID[2]
+    return build_compact_store(method=method, dims=dims, dtype=dtype, features_path=features_path)
+
+
+class CompactIndex:
+    """Search over the compact matrix with exact re-rank against the full vectors.
+
+    Wraps a FeatureIndex, which keeps supplying the full vectors, names, URLs
+    and ids. If the compact files are missing or were built from a different
+    version of the feature store, searches fall through to the exact index.
+    """
+
+    def __init__(self, feature_index, compact_path=COMPACT_PATH, meta_path=COMPACT_META_PATH, rerank_factor=10):
+        self.feature_index = feature_index
+        self.compact_path = compact_path
+        self.meta_path = meta_path
+        self.rerank_factor = rerank_factor
+        self._state = None
+        self._signature = None
+
+    def _load(self):
+        try:
+            sig = (os.stat(self.compact_path).st_mtime_ns, os.stat(self.meta_path).st_mtime_ns,
+                   tuple(_source_signature(self.feature_index.features_path)))
+        except OSError:
+            self._state = None
+            return None
+        if sig == self._signature:
+            return self._state
+        with np.load(self.meta_path) as meta:
+            if tuple(meta['source']) != sig[2]:
+                print("Compact features are stale relative to all_features.npy; using exact search")
+                self._state, self._signature = None, sig
+                return None
+            projection = Projection(str(meta['method']),
+                                    meta['mean'] if 'mean' in meta.files else None,
+                                    meta['components'] if 'components' in meta.files else None)
+            scales = meta['scales'] if 'scales' in meta.files else None
+        matrix = np.load(self.compact_path, mmap_mode='r')
+        self._state = (matrix, scales, projection)
+        self._signature = sig
+        return self._state
+
+    def __getattr__(self, name):
+        return getattr(self.feature_index, name)
+
+    def __len__(self):
+        return len(self.feature_index)
+
+    def search(self, query_vec, top_k=5):
+        self.feature_index.refresh()
+        compact = self._load()
+        if compact is None or query_vec is None or top_k <= 0:
+            return self.feature_index.search(query_vec, top_k=top_k)
+        matrix, scales, projection = compact
+        fstate = self.feature_index._state
+        if fstate is None or len(fstate[0]) != len(matrix):
+            return self.feature_index.search(query_vec, top_k=top_k)
+        candidates = candidate_rows(matrix, scales, projection, query_vec, top_k * self.rerank_factor)
+        return rerank(fstate, candidates, query_vec, top_k)
+
+
+def candidate_rows(matrix, scales, projection, query_vec, n_candidates):
+    q = projection.transform(np.asarray(query_vec, dtype=np.float32).ravel()[None, :])[0]
+    sims = np.asarray(matrix, dtype=np.float32) @ q
+    if scales is not None:
+        sims *= scales
+    n = len(sims)
+    if n_candidates >= n:
+        return np.arange(n)
+    return np.argpartition(-sims, n_candidates - 1)[:n_candidates]
+
+
+def rerank(fstate, candidates, query_vec, top_k):
+    features, names, urls, _, ids = fstate
+    q = _normalize_rows(np.asarray(query_vec, dtype=np.float32).ravel())
+    rows = np.sort(candidates)
+    sims = np.asarray(features[rows], dtype=np.float32) @ q
+    order = np.argsort(-sims)[:top_k]
+    return [(int(rows[i]), float(sims[i]), names[rows[i]], urls[rows[i]],
+             ids[rows[i]] if ids is not None else None) for i in order]
+
+
+def recall_report(features_path=FEATURES_PATH, dims_list=(64, 128, 256, 512), methods=METHODS,
+                  dtypes=('float16', 'int8'), k=10, n_queries=200, rerank_factor=10, seed=0):
+    """Compare compact+re-rank results against exact cosine search.
+
+    Queries are catalog vectors (the common /similar case); the query row
+    itself is excluded from both result lists. Returns a list of dicts with
+    recall@k, bytes per vector and mean query latency for each configuration.
+    """
+    features = np.load(features_path, mmap_mode='r')
+    full = _normalize_rows(features)
+    n = len(full)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(n, size=min(n, n_queries), replace=False)
+
+    def top(sims, qi, kk):
+        sims = sims.copy()
+        sims[qi] = -np.inf
+        return np.argpartition(-sims, kk - 1)[:kk]
+
+    exact = {}
+    t0 = time.perf_counter()
+    for qi in queries:
+        exact[qi] = set(top(full @ full[qi], qi, k).tolist())
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+
+    fstate = (full, [''] * n, [''] * n, None, None)
+    report = []
+    for method in methods:
+        for dims in (dims_list if method != 'pool' else (VGG_GRID[2],)):
+            if method == 'pool' and full.shape[1] != int(np.prod(VGG_GRID)):
+                continue
+            projection = Projection.fit(full, method=method, dims=dims)
+            for dtype in dtypes:
+                matrix, scales = compact_matrix(full, projection, dtype)
+                hits = 0
+                t0 = time.perf_counter()
+                for qi in queries:
+                    cand = candidate_rows(matrix, scales, projection, full[qi], k * rerank_factor + 1)
+                    got = [r for r, *_ in rerank(fstate, cand, full[qi], k + 1) if r != qi][:k]
+                    hits += len(exact[qi].intersection(got))
+                ms = (time.perf_counter() - t0) * 1000 / len(queries)
+                report.append({
+                    'method': method,
+                    'dims': int(projection.dims),
+                    'dtype': dtype,
+                    'recall_at_k': hits / (k * len(queries)),
+                    'bytes_per_vector': int(matrix.shape[1] * matrix.itemsize + (4 if scales is not None else 0)),
+                    'query_ms': round(ms, 3),
+                    'exact_query_ms': round(exact_ms, 3),
+                })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    rep = sub.add_parser('report', help='recall of compact+re-rank search vs exact search')
+    rep.add_argument('--dims', type=int, nargs='+', default=[64, 128, 256, 512])
+    rep.add_argument('--methods', nargs='+', default=list(METHODS), choices=METHODS)
+    rep.add_argument('--dtypes', nargs='+', default=['float16', 'int8'])
+    rep.add_argument('-k', type=int, default=10)
+    rep.add_argument('--queries', type=int, default=200)
+    rep.add_argument('--rerank-factor', type=int, default=10)
+    rep.add_argument('--out', help='also write the report as JSON to this path')
+    bld = sub.add_parser('build', help='fit and write the compact feature store')
+    bld.add_argument('--method', default='pca', choices=METHODS)
+    bld.add_argument('--dims', type=int, default=256)
+    bld.add_argument('--dtype', default='float16', choices=['float16', 'int8'])
+    args = parser.parse_args(argv)
+
+    if args.cmd == 'build':
+        build_compact_store(method=args.method, dims=args.dims, dtype=args.dtype)
+        return 0
+    report = recall_report(dims_list=args.dims, methods=args.methods, dtypes=args.dtypes, k=args.k,
+                           n_queries=args.queries, rerank_factor=args.rerank_factor)
+    print(f"{'method':<10} {'dims':>5} {'dtype':<8} {'recall@k':>9} {'bytes/vec':>10} {'ms/query':>9}")
+    for r in report:
+        print(f"{r['method']:<10} {r['dims']:>5} {r['dtype']:<8} {r['recall_at_k']:>9.3f} "
+              f"{r['bytes_per_vector']:>10} {r['query_ms']:>9.3f}")
+    if report:
+        print(f"exact search: {report[0]['exact_query_ms']:.3f} ms/query")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from Utilities import Metrics
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with a fixed number of entries."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return default
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _digest(prefix, value):
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return prefix + '-' + hashlib.sha1(value).hexdigest()
+
+
+class QueryEmbeddingCache:
+    """Two-tier cache for query image embeddings.
+
+    Lookups go, in order, to an in-process LRU keyed by URL, to the catalog
+    feature index (query images are usually catalog images we already
+    embedded), and to an on-disk ``.npy`` store keyed by URL hash. Only when
+    all of those miss is the image downloaded; its bytes are then checked
+    against the disk store by content hash before the model is run.
+
+    The disk store holds at most ``max_disk_entries`` files (URL and content
+    keys alike). Hits refresh a file's mtime, and once the limit is passed the
+    least recently used files are removed down to ``prune_ratio`` of it.
+    """
+
+    def __init__(self, cache_dir, maxsize=512, feature_index=None, max_disk_entries=20000, prune_ratio=0.9):
+        self.cache_dir = cache_dir
+        self.feature_index = feature_index
+        self.max_disk_entries = max_disk_entries
+        self.prune_ratio = prune_ratio
+        self._memory = LRUCache(maxsize)
+        # files on disk as of the last scan plus those written since; None
+        # until the first write scans the directory
+        self._disk_entries = None
+        self._disk_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'catalog_hits': 0,
+            'disk_hits': 0,
+            'content_hits': 0,
+            'misses': 0,
+            'errors': 0,
+            'disk_evictions': 0,
+        }
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+        Metrics.CACHE_LOOKUPS.inc(cache='image_query', result=key)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def _disk_get(self, key):
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            vec = np.load(path)
+            # mtime is the recency the disk store is pruned by
+            os.utime(path)
+            return vec
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable query cache entry {path}: {e}")
+            return None
+
+    def _disk_put(self, key, vec):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._disk_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, vec)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not persist query embedding {key}: {e}")
+            return
+        with self._disk_lock:
+            if self._disk_entries is None:
+                self._disk_entries = len(self._disk_files())
+            else:
+                self._disk_entries += 1
+            if self._disk_entries > self.max_disk_entries:
+                self._prune()
+
+    def _disk_files(self):
+        try:
+            return [e for e in os.scandir(self.cache_dir) if e.name.endswith('.npy')]
+        except OSError:
+            return []
+
+    def _prune(self):
+        """Remove the least recently used files down to the low watermark."""
+        entries = []
+        for e in self._disk_files():
+            try:
+                entries.append((e.stat().st_mtime_ns, e.path))
+            except OSError:
+                pass  # removed by another worker
+        keep = int(self.max_disk_entries * self.prune_ratio)
+        entries.sort()
+        removed = 0
+        for _, path in entries[:max(len(entries) - keep, 0)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        self._disk_entries = len(entries) - removed
+        with self._stats_lock:
+            self.stats['disk_evictions'] += removed
+
+    def get_or_compute(self, url, download, embed):
+        """Return the embedding for ``url``.
+
+        ``download(url)`` must return the raw image bytes (or None) and
+        ``embed(data)`` the normalized feature vector for those bytes (or None).
+        """
+        if not url:
+            return None
+        vec = self._memory.get(url)
+        if vec is not None:
+            self._count('memory_hits')
+            return vec
+        if self.feature_index is not None:
+            vec = self.feature_index.vector_for_url(url)
+            if vec is not None:
+                self._count('catalog_hits')
+                self._memory.put(url, vec)
+                return vec
+        url_key = _digest('url', url)
+        vec = self._disk_get(url_key)
+        if vec is not None:
+            self._count('disk_hits')
+            self._memory.put(url, vec)
+            return vec
+
+        data = download(url)
+        if data is None:
+            self._count('errors')
+            return None
+        content_key = _digest('sha1', data)
+        vec = self._disk_get(content_key)
+        if vec is not None:
+            self._count('content_hits')
+        else:
+            self._count('misses')
+            vec = embed(data)
+            if vec is None:
+                self._count('errors')
+                return None
+            vec = np.asarray(vec, dtype=np.float32)
+            self._disk_put(content_key, vec)
+        self._disk_put(url_key, vec)
+        self._memory.put(url, vec)
+        return vec
+
+    def snapshot(self):
+        """Return a copy of the hit/miss counters plus current LRU size."""
+        with self._stats_lock:
+            out = dict(self.stats)
+        lookups = sum(v for k, v in out.items() if k not in ('errors', 'disk_evictions'))
+        hits = lookups - out['misses']
+        out['memory_entries'] = len(self._memory)
+        out['hit_rate'] = (hits / lookups) if lookups else 0.0
+        return out
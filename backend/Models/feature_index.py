@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import threading
+import numpy as np
+
+
+class FeatureIndex:
+    """Long-lived view over the catalog image features on disk.
+
+    The feature matrix is opened with ``mmap_mode='r'`` so forked gunicorn
+    workers share the same page cache instead of each holding a private copy.
+    Vectors are L2-normalized once (written to a ``.normed.npy`` sidecar when
+    the source file is not already normalized), so a query is a single dot
+    product followed by a partial top-k selection. The backing files are
+    re-opened only when their mtime/size change.
+    """
+
+    def __init__(self, features_path, names_path, urls_path, ids_path=None, check_interval=2.0):
+        self.features_path = features_path
+        self.names_path = names_path
+        self.urls_path = urls_path
+        self.ids_path = ids_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._last_check = 0.0
+        # (features, names, urls, url_to_row, ids) swapped as one reference so
+        # readers never observe a half-loaded index
+        self._state = None
+
+    def _file_signature(self):
+        sig = []
+        for path in (self.features_path, self.names_path, self.urls_path):
+            try:
+                st = os.stat(path)
+                sig.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                sig.append(None)
+        return tuple(sig)
+
+    def _normed_path(self):
+        root, _ = os.path.splitext(self.features_path)
+        return root + '.normed.npy'
+
+    def _open_normalized(self, signature):
+        """Return a read-only memmap of unit-length feature rows."""
+        raw = np.load(self.features_path, mmap_mode='r')
+        if raw.ndim != 2 or raw.shape[0] == 0:
+            return np.asarray(raw, dtype=np.float32).reshape(len(raw), -1)
+        # features written by extract_features are already unit length; in
+        # that case serve the source file directly
+        sample = np.asarray(raw[:min(len(raw), 256)], dtype=np.float32)
+        norms = np.linalg.norm(sample, axis=1)
+        if raw.dtype == np.float32 and np.allclose(norms, 1.0, atol=1e-3):
+            return raw
+
+        normed_path = self._normed_path()
+        meta_path = normed_path + '.json'
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('source') == list(signature[0]) and os.path.exists(normed_path):
+                return np.load(normed_path, mmap_mode='r')
+        except (OSError, ValueError):
+            pass
+
+        tmp_path = f"{normed_path}.{os.getpid()}.tmp"
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=raw.shape)
+        chunk = 1024
+        for start in range(0, raw.shape[0], chunk):
+            block = np.asarray(raw[start:start + chunk], dtype=np.float32)
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            out[start:start + chunk] = block / norms
+        out.flush()
+        del out
+        os.replace(tmp_path, normed_path)
+        with open(meta_path, 'w') as f:
+            json.dump({'source': list(signature[0])}, f)
+        return np.load(normed_path, mmap_mode='r')
+
+    def refresh(self, force=False):
+        """Reload the index if the files on disk changed. Returns True on reload."""
+        now = time.monotonic()
+        if not force and self._state is not None and now - self._last_check < self.check_interval:
+            return False
+        with self._lock:
+            self._last_check = now
+            signature = self._file_signature()
+            if not force and self._state is not None and signature == self._signature:
+                return False
+            if signature[0] is None:
+                return False
+            features = self._open_normalized(signature)
+            with open(self.names_path, 'r') as f:
+                names = json.load(f)
+            with open(self.urls_path, 'r') as f:
+                urls = json.load(f)
+            ids = None
+            if self.ids_path and os.path.exists(self.ids_path):
+                with open(self.ids_path, 'r') as f:
+                    ids = json.load(f)
+                if len(ids) != len(urls):
+                    ids = None
+            if not (len(features) == len(names) == len(urls)):
+                # a writer is midway through replacing the files; keep
+                # serving the previous version and retry on the next check
+                print(f"Feature index files out of sync ({len(features)}/{len(names)}/{len(urls)}), not reloading")
+                return False
+            url_to_row = {u: i for i, u in enumerate(urls)}
+            self._state = (features, names, urls, url_to_row, ids)
+            self._signature = signature
+            return True
+
+    def __len__(self):
+        self.refresh()
+        return 0 if self._state is None else len(self._state[0])
+
+    def vector_for_url(self, url):
+        """Return the stored (normalized) vector for a catalog image URL, or None."""
+        self.refresh()
+        state = self._state
+        if state is None:
+            return None
+        row = state[3].get(url)
+        if row is None:
+            return None
+        return np.asarray(state[0][row], dtype=np.float32)
+
+    def search(self, query_vec, top_k=5):
+        """Return [(row, score, name, url, product_id), ...] for the top_k most similar rows.
+
+        ``product_id`` is None when the index was built without an ids file.
+        """
+        self.refresh()
+        state = self._state
+        if state is None or query_vec is None:
+            return []
+        features = state[0]
+        n = len(features)
+        if n == 0 or top_k <= 0:
+            return []
+        q = np.asarray(query_vec, dtype=np.float32).ravel()
+        qn = np.linalg.norm(q)
+        if qn == 0:
+            return []
+        sims = features @ (q / qn)
+        if top_k >= n:
+            top = np.argsort(-sims)
+        else:
+            top = np.argpartition(-sims, top_k - 1)[:top_k]
+            top = top[np.argsort(-sims[top])]
+        names, urls, ids = state[1], state[2], state[4]
+        return [(int(i), float(sims[i]), names[i], urls[i], ids[i] if ids is not None else None) for i in top]
@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+from Utilities.Database import DB_PATH, configure
+
+LEGACY_JSON_PATH = 'Models/user_preference.json'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS feedback_items (
+    user_id TEXT NOT NULL,
+    kind TEXT CHECK(kind IN ('liked','disliked')) NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE(user_id, kind, value)
+);
+CREATE TABLE IF NOT EXISTS feedback_reasons (
+    user_id TEXT NOT NULL,
+    kind TEXT CHECK(kind IN ('liked','disliked')) NOT NULL,
+    attr TEXT NOT NULL,
+    value TEXT NOT NULL,
+    UNIQUE(user_id, kind, attr, value)
+);
+CREATE TABLE IF NOT EXISTS feedback_versions (
+    user_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS feedback_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+
+class FeedbackStore:
+    """SQLite-backed user feedback (liked/disliked products and reasons).
+
+    Each swipe becomes a couple of ``INSERT OR IGNORE`` rows instead of a
+    rewrite of the whole preferences file, and reads fetch one user's rows
+    through the ``(user_id, ...)`` unique indexes. Writes are buffered and
+    flushed in one transaction when ``batch_size`` events are pending, after
+    ``flush_interval`` seconds, or before any read from this process. Every
+    flush bumps the affected users' version so per-user caches can tell when
+    their feedback changed.
+    """
+
+    def __init__(self, db_path=DB_PATH, batch_size=64, flush_interval=0.5, legacy_json_path=LEGACY_JSON_PATH):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.legacy_json_path = legacy_json_path
+        self._local = threading.local()
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._init_schema()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = configure(sqlite3.connect(self.db_path, timeout=30))
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._migrate_legacy_json(conn)
+
+    def _migrate_legacy_json(self, conn):
+        """One-time import of the old user_preference.json file."""
+        if conn.execute("SELECT 1 FROM feedback_meta WHERE key = 'legacy_json_imported'").fetchone():
+            return
+        events = []
+        if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+            try:
+                with open(self.legacy_json_path, 'r', encoding='utf-8') as f:
+                    legacy = json.load(f)
+            except (OSError, ValueError) as e:
+                print('Warning: could not read legacy feedback file -', e)
+                legacy = {}
+            for user_id, data in legacy.items():
+                for val in data.get('products', []) + data.get('disliked_products', []):
+                    events.append((user_id, 'disliked', val, {}))
+                for val in data.get('liked_products', []):
+                    events.append((user_id, 'liked', val, {}))
+                for kind, field in (('disliked', 'reasons'), ('liked', 'liked_reasons')):
+                    for attr, vals in data.get(field, {}).items():
+                        events.append((user_id, kind, None, {attr: vals}))
+        with conn:
+            self._write(conn, events)
+            conn.execute("INSERT OR REPLACE INTO feedback_meta(key, value) VALUES ('legacy_json_imported', ?)",
+                         (str(time.time()),))
+
+    @staticmethod
+    def _write(conn, events):
+        items, reasons, users = [], [], set()
+        for user_id, kind, value, event_reasons in events:
+            users.add(user_id)
+            if value:
+                items.append((user_id, kind, str(value)))
+            for attr, vals in event_reasons.items():
+                for val in (vals if isinstance(vals, list) else [vals]):
+                    reasons.append((user_id, kind, attr, str(val)))
+        if items:
+            conn.executemany('INSERT OR IGNORE INTO feedback_items(user_id, kind, value) VALUES (?,?,?)', items)
+        if reasons:
+            conn.executemany('INSERT OR IGNORE INTO feedback_reasons(user_id, kind, attr, value) VALUES (?,?,?,?)', reasons)
+        if users:
+            conn.executemany('''INSERT INTO feedback_versions(user_id, version) VALUES (?, 1)
+                                ON CONFLICT(user_id) DO UPDATE SET version = version + 1''',
+                             [(u,) for u in users])
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name='feedback-flusher', daemon=True)
+        self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print('feedback flush error', e)
+
+    def record(self, user_id, kind, value, reasons=None):
+        """Queue one feedback event; it is written on the next flush."""
+        if not user_id:
+            return
+        with self._pending_lock:
+            self._pending.append((str(user_id), kind, value, reasons or {}))
+            full = len(self._pending) >= self.batch_size
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write all pending events in one transaction."""
+        with self._flush_lock:
+            with self._pending_lock:
+                events, self._pending = self._pending, []
+            if not events:
+                return 0
+            conn = self._conn()
+            with conn:
+                self._write(conn, events)
+            return len(events)
+
+    def version(self, user_id):
+        self.flush()
+        row = self._conn().execute('SELECT version FROM feedback_versions WHERE user_id = ?', (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def get_user(self, user_id):
+        """Return one user's feedback in the legacy JSON shape.
+
+        Dislike reasons that the user also liked are left out, matching the
+        old "concise" behaviour.
+        """
+        self.flush()
+        conn = self._conn()
+        data = {"products": [], "reasons": {}, "liked_products": [], "liked_reasons": {}}
+        for kind, value in conn.execute(
+                'SELECT kind, value FROM feedback_items WHERE user_id = ? ORDER BY rowid', (user_id,)):
+            data["liked_products" if kind == 'liked' else "products"].append(value)
+        for kind, attr, value in conn.execute(
+                'SELECT kind, attr, value FROM feedback_reasons WHERE user_id = ? ORDER BY rowid', (user_id,)):
+            field = "liked_reasons" if kind == 'liked' else "reasons"
+            data[field].setdefault(attr, []).append(value)
+        for attr, vals in list(data["reasons"].items()):
+            liked_vals = set(data["liked_reasons"].get(attr, []))
+            data["reasons"][attr] = [v for v in vals if v not in liked_vals]
+        return data
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide FeedbackStore on the main app database."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = FeedbackStore()
+                atexit.register(_store.flush)
+    return _store
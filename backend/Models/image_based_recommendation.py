@@ -1,42 +1,100 @@
 import os
 import json
 import numpy as np
-import pandas as pd
-from tensorflow.keras.applications.vgg16 import VGG16, preprocess_input
-from tensorflow.keras.models import Model
-from tensorflow.keras.preprocessing import image
-from sklearn.metrics.pairwise import cosine_similarity
-from PIL import Image
 from io import BytesIO
-import urllib
+import urllib.request
+import time
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from Models.feature_index import FeatureIndex
+from Models.embedding_cache import QueryEmbeddingCache
+from Models import compact_features
+from Utilities import Metrics
+from Utilities.Database import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock on Windows; single worker there
+    fcntl = None
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Load VGG16 model for feature extraction
-base_model = VGG16(weights='imagenet', include_top=False)
-model = Model(inputs=base_model.input, outputs=base_model.output)
+# VGG16 is built on first use (see get_model) so importing this module does
+# not pull in TensorFlow
+model = None
+_model_lock = threading.Lock()
 
 FEATURES_PATH = os.path.join(BASE_DIR, "../Models/all_features.npy")
 NAMES_PATH = os.path.join(BASE_DIR, "../Models/all_image_names.json")
 URLS_PATH = os.path.join(BASE_DIR, "../Models/all_image_urls.json")
+IDS_PATH = os.path.join(BASE_DIR, "../Models/all_image_ids.json")
+PROGRESS_PATH = os.path.join(BASE_DIR, "../Models/feature_progress.json")
+FAILED_PATH = os.path.join(BASE_DIR, "../Models/failed_images.json")
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "../Models/feature_checkpoint")
+# held (flock) for the whole of an extraction run, across workers
+EXTRACT_LOCK_PATH = os.path.join(BASE_DIR, "../Models/feature_extract.lock")
+# 'exact' scans the full vectors; 'compact' scans the reduced store built by
+# `python -m Models.compact_features build` and re-ranks its top candidates
+IMAGE_INDEX_MODE = os.getenv('IMAGE_INDEX_MODE', 'exact')
+QUERY_CACHE_DIR = os.path.join(BASE_DIR, "../Models/query_cache")
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '512'))
+# files kept in QUERY_CACHE_DIR (least recently used are removed first)
+QUERY_CACHE_DISK_ENTRIES = int(os.getenv('QUERY_CACHE_DISK_ENTRIES', '20000'))
+# seconds before a stalled image download is abandoned
+DOWNLOAD_TIMEOUT = float(os.getenv('IMAGE_DOWNLOAD_TIMEOUT', '10'))
 
-def preprocess_image(img_url):
+def get_model():
+    """
+    Returns the VGG16 feature extractor, importing TensorFlow and building the
+    model the first time it is needed.
+    """
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                from tensorflow.keras.applications.vgg16 import VGG16
+                from tensorflow.keras.models import Model
+                base_model = VGG16(weights='imagenet', include_top=False)
+                model = Model(inputs=base_model.input, outputs=base_model.output)
+    return model
+
+def download_image(img_url):
+    try:
+        with Metrics.stage('image_download'), urllib.request.urlopen(img_url, timeout=DOWNLOAD_TIMEOUT) as url_response:
+            return url_response.read()
+    except Exception as e:
+        print(f"Error loading image from {img_url}: {e}")
+        return None
+
+def preprocess_image_bytes(img_data):
+    from PIL import Image
+    from tensorflow.keras.applications.vgg16 import preprocess_input
+    from tensorflow.keras.preprocessing import image
     try:
-        with urllib.request.urlopen(img_url) as url_response:
-            img_data = url_response.read()
+        with Metrics.stage('image_preprocess'):
             img = Image.open(BytesIO(img_data)).convert('RGB')
             img = img.resize((224, 224))
             img_array = image.img_to_array(img)
             img_array_expanded = np.expand_dims(img_array, axis=0)
             return preprocess_input(img_array_expanded)
     except Exception as e:
-        print(f"Error loading image from {img_url}: {e}")
+        print(f"Error decoding image: {e}")
+        return None
+
+def preprocess_image(img_url):
+    img_data = download_image(img_url)
+    if img_data is None:
         return None
+    return preprocess_image_bytes(img_data)
 
 def extract_features(model, preprocessed_img):
     if preprocessed_img is None:
         return None
-    features = model.predict(preprocessed_img)
+    Metrics.MODEL_CALLS.inc(model='vgg16')
+    with Metrics.stage('image_predict'):
+        features = model.predict(preprocessed_img)
     flattened_features = features.flatten()
     normalized_features = flattened_features / np.linalg.norm(flattened_features)
     return normalized_features
@@ -48,6 +106,8 @@ def extract_all_features():
     all_features = []
     all_image_names = []
     all_image_urls = []
+    import pandas as pd
+    model = get_model()
     df = pd.read_csv(os.path.join(BASE_DIR, "../Datasets/alo_yoga_products.csv"))
     for _, row in df.iterrows():
         img_url = row.get('image_url')
@@ -69,13 +129,258 @@ def extract_all_features():
     print(f"Extracted and saved features for {len(all_features)} images.")
     return np.array(all_features), all_image_names, all_image_urls
 
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _write_progress(status, total, processed, last=None, **extra):
+    data = {"status": status, "total": total, "processed": processed, "last": last}
+    data.update(extra)
+    _write_json_atomic(PROGRESS_PATH, data)
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def _read_image_products(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        cur = conn.execute("SELECT id, name, image FROM products WHERE image IS NOT NULL AND image <> '' ORDER BY id")
+        return [(r[0], r[1] or '', r[2].strip()) for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+def _load_checkpoint():
+    """Returns {product_id: (url, name, vector)} for batches finished by an interrupted run."""
+    done = {}
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return done
+    for fname in sorted(os.listdir(CHECKPOINT_DIR)):
+        if not fname.endswith('.npz'):
+            continue
+        try:
+            with np.load(os.path.join(CHECKPOINT_DIR, fname), allow_pickle=False) as chunk:
+                for pid, url, name, vec in zip(chunk['ids'], chunk['urls'], chunk['names'], chunk['features']):
+                    done[int(pid)] = (str(url), str(name), vec)
+        except Exception as e:
+            print(f"Ignoring unreadable checkpoint {fname}: {e}")
+    return done
+
+def _fetch_one(pid, name, url):
+    return (pid, name, url, download_image(url))
+
+def _embed_batch(items):
+    """
+    items: [(pid, name, url, img_data)]. Runs one model.predict over every
+    decodable image and returns ([(pid, name, url, vector)], [failed urls]).
+    """
+    arrays, ok, failed = [], [], []
+    for pid, name, url, img_data in items:
+        arr = preprocess_image_bytes(img_data) if img_data is not None else None
+        if arr is None:
+            failed.append(url)
+            continue
+        arrays.append(arr)
+        ok.append((pid, name, url))
+    if not arrays:
+        return [], failed
+    Metrics.MODEL_CALLS.inc(model='vgg16')
+    with Metrics.stage('image_predict'):
+        feats = get_model().predict(np.vstack(arrays), batch_size=len(arrays), verbose=0)
+    feats = feats.reshape(len(arrays), -1).astype(np.float32)
+    norms = np.linalg.norm(feats, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    feats /= norms
+    return [(pid, name, url, feats[i]) for i, (pid, name, url) in enumerate(ok)], failed
+
+def _write_feature_store(rows):
+    """
+    rows: [(pid, name, url, vector-or-callable)] in final order. Writes the
+    matrix through a memmap so the full catalog never has to sit in RAM twice.
+    Metadata is written first and the features file last, so readers that
+    watch the features mtime never pick up a half-written store.
+    """
+    if not rows:
+        return
+    dim = len(rows[0][3])
+    tmp_path = f"{FEATURES_PATH}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=(len(rows), dim))
+    for i, (_, _, _, vec) in enumerate(rows):
+        out[i] = vec
+    out.flush()
+    del out
+    _write_json_atomic(IDS_PATH, [pid for pid, _, _, _ in rows])
+    _write_json_atomic(NAMES_PATH, [name for _, name, _, _ in rows])
+    _write_json_atomic(URLS_PATH, [url for _, _, url, _ in rows])
+    os.replace(tmp_path, FEATURES_PATH)
+
+class ExtractionRunning(RuntimeError):
+    """Another extraction run (in this or another process) holds the lock."""
+
+
+_extract_thread_lock = threading.Lock()
+
+
+def _acquire_extract_lock():
+    """Take the extraction lock without waiting; returns a release callable or None."""
+    if not _extract_thread_lock.acquire(blocking=False):
+        return None
+    handle = None
+    try:
+        if fcntl is not None:
+            handle = open(EXTRACT_LOCK_PATH, 'w')
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        if handle is not None:
+            handle.close()
+        _extract_thread_lock.release()
+        return None
+
+    def release():
+        if handle is not None:
+            handle.close()
+        _extract_thread_lock.release()
+    return release
+
+
+def start_extraction(retry_failed=False):
+    """Run extract_all_features_from_db in a background thread. Returns False
+    if a run is already in progress in this or another worker."""
+    release = _acquire_extract_lock()
+    if release is None:
+        return False
+
+    def run():
+        try:
+            _extract_all_features(retry_failed=retry_failed)
+        except Exception as e:
+            print('background extract error', e)
+        finally:
+            release()
+    threading.Thread(target=run, name='feature-extract', daemon=True).start()
+    return True
+
+
+def extraction_progress():
+    return _read_json(PROGRESS_PATH, {"status": "idle"})
+
+
+def extract_all_features_from_db(db_path=None, batch_size=32, workers=8, retry_failed=False):
+    """Locked entry point of _extract_all_features; raises ExtractionRunning
+    if another run holds the lock (runs share CHECKPOINT_DIR)."""
+    release = _acquire_extract_lock()
+    if release is None:
+        raise ExtractionRunning('feature extraction is already running')
+    try:
+        return _extract_all_features(db_path, batch_size, workers, retry_failed)
+    finally:
+        release()
+
+
+def _extract_all_features(db_path=None, batch_size=32, workers=8, retry_failed=False):
+    """
+    Extract VGG16 features for every product image in the products table.
+
+    Images are downloaded by a thread pool while the previous batch runs
+    through a single batched model.predict. Each finished batch is saved to
+    Models/feature_checkpoint/ and progress to feature_progress.json, so an
+    interrupted run resumes where it stopped. Products whose image URL is
+    already in the feature store are not re-processed; products removed from
+    the table are dropped. Returns the number of newly embedded images.
+    """
+    products = _read_image_products(db_path or DB_PATH)
+    existing_urls = _read_json(URLS_PATH, []) if os.path.exists(FEATURES_PATH) else []
+    existing_rows = {u: i for i, u in enumerate(existing_urls)}
+    failed = set(_read_json(FAILED_PATH, []))
+    if retry_failed:
+        failed = set()
+    checkpoint = _load_checkpoint()
+
+    todo = []
+    for pid, name, url in products:
+        if url in existing_rows or url in failed:
+            continue
+        done = checkpoint.get(pid)
+        if done is not None and done[0] == url:
+            continue
+        todo.append((pid, name, url))
+
+    total = len(todo)
+    processed = 0
+    last = None
+    _write_progress("running", total, processed, last)
+    if todo:
+        print(f"Extracting features for {total} new/changed product images...")
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    chunk_no = len([f for f in os.listdir(CHECKPOINT_DIR) if f.endswith('.npz')])
+    started = time.time()
+    embedded_count = 0
+
+    batches = [todo[i:i + batch_size] for i in range(0, total, batch_size)]
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # downloads for batch n+1 run while batch n is in model.predict
+            pending = [pool.submit(_fetch_one, pid, name, url) for pid, name, url in batches[0]] if batches else []
+            for n in range(len(batches)):
+                items = [f.result() for f in pending]
+                pending = [pool.submit(_fetch_one, pid, name, url) for pid, name, url in batches[n + 1]] if n + 1 < len(batches) else []
+                embedded, batch_failed = _embed_batch(items)
+                failed.update(batch_failed)
+                if embedded:
+                    chunk_path = os.path.join(CHECKPOINT_DIR, f"chunk_{chunk_no:05d}.npz")
+                    np.savez(chunk_path + '.tmp.npz',
+                             ids=np.array([e[0] for e in embedded], dtype=np.int64),
+                             names=np.array([e[1] for e in embedded]),
+                             urls=np.array([e[2] for e in embedded]),
+                             features=np.vstack([e[3] for e in embedded]))
+                    os.replace(chunk_path + '.tmp.npz', chunk_path)
+                    chunk_no += 1
+                    embedded_count += len(embedded)
+                    for pid, name, url, vec in embedded:
+                        checkpoint[pid] = (url, name, vec)
+                _write_json_atomic(FAILED_PATH, sorted(failed))
+                processed += len(items)
+                last = items[-1][0]
+                rate = processed / max(time.time() - started, 1e-6)
+                _write_progress("running", total, processed, last, images_per_sec=round(rate, 2))
+    except Exception as e:
+        _write_progress("error", total, processed, last, message=str(e))
+        raise
+
+    # merge unchanged rows from the current store with the new vectors, in
+    # products-table order, then drop the checkpoint
+    current = np.load(FEATURES_PATH, mmap_mode='r') if existing_urls else None
+    rows = []
+    for pid, name, url in products:
+        done = checkpoint.get(pid)
+        if done is not None and done[0] == url:
+            rows.append((pid, name, url, done[2]))
+        elif url in existing_rows and current is not None:
+            rows.append((pid, name, url, current[existing_rows[url]]))
+    stored = len(rows)
+    if total or stored != len(existing_urls) or not os.path.exists(IDS_PATH):
+        _write_feature_store(rows)
+        compact_features.rebuild_if_present(FEATURES_PATH)
+    del current, rows[:]
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
+    _write_progress("done", total, processed, last, stored=stored, failed=len(failed))
+    print(f"Extracted features for {embedded_count} images; store has {stored} rows.")
+    return embedded_count
+
 def ensure_features_exist():
     """
     Ensure that features, names, and urls files exist. If not, extract and save them.
     """
     if not (os.path.exists(FEATURES_PATH) and os.path.exists(NAMES_PATH) and os.path.exists(URLS_PATH)):
-        print("Feature files not found. Extracting features from CSV...")
-        extract_all_features()
+        print("Feature files not found. Extracting features from the products table...")
+        extract_all_features_from_db()
     else:
         print("Feature files found. Using saved features.")
 
@@ -92,23 +397,70 @@ def load_catalog_features():
         all_image_names = json.load(f)
     return all_features, all_image_names, all_image_urls
 
+_feature_index = None
+_feature_index_lock = threading.Lock()
+
+def get_feature_index():
+    """
+    Returns the process-wide FeatureIndex, creating it on first use. The index
+    reloads itself when the files change; until features have been extracted
+    (POST /admin/extract_features) it returns no results.
+    """
+    global _feature_index
+    if _feature_index is None:
+        with _feature_index_lock:
+            if _feature_index is None:
+                if not os.path.exists(FEATURES_PATH):
+                    print("Feature files not found. Run /admin/extract_features to build them.")
+                index = FeatureIndex(FEATURES_PATH, NAMES_PATH, URLS_PATH, ids_path=IDS_PATH)
+                if IMAGE_INDEX_MODE == 'compact':
+                    index = compact_features.CompactIndex(index)
+                _feature_index = index
+    return _feature_index
+
+_query_cache = None
+
+def get_query_cache():
+    """
+    Returns the process-wide QueryEmbeddingCache backed by the catalog feature index.
+    """
+    global _query_cache
+    if _query_cache is None:
+        with _feature_index_lock:
+            if _query_cache is None:
+                _query_cache = QueryEmbeddingCache(QUERY_CACHE_DIR, maxsize=QUERY_CACHE_SIZE,
+                                                   max_disk_entries=QUERY_CACHE_DISK_ENTRIES)
+    if _query_cache.feature_index is None:
+        _query_cache.feature_index = get_feature_index()
+    return _query_cache
+
+def query_cache_stats():
+    return get_query_cache().snapshot()
+
+def get_query_features(query_img_url):
+    """
+    Returns the normalized feature vector for a query image, served from the
+    query cache / catalog when possible and from VGG16 otherwise.
+    """
+    def embed(img_data):
+        return extract_features(get_model(), preprocess_image_bytes(img_data))
+    return get_query_cache().get_or_compute(query_img_url, download_image, embed)
+
 def recommend_from_image(query_img_url, top_k=5):
-    all_features, all_image_names, all_image_urls = load_catalog_features()
-    query_preprocessed = preprocess_image(query_img_url)
-    if query_preprocessed is None:
-        print(f"Could not process query image: {query_img_url}")
-        return []
-    query_features = extract_features(model, query_preprocessed)
+    index = get_feature_index()
+    query_features = get_query_features(query_img_url)
     if query_features is None:
         print(f"Could not extract features from query image: {query_img_url}")
         return []
-    similarities = cosine_similarity([query_features], all_features)[0]
-    top_indices = similarities.argsort()[-top_k:][::-1]
+    with Metrics.stage('image_similarity'):
+        hits = index.search(query_features, top_k=top_k)
+    Metrics.ROWS_SCANNED.inc(len(index), source='image_index')
     recommendations = []
-    for idx in top_indices:
+    for _, _, name, url, product_id in hits:
         recommendations.append({
-            "name": all_image_names[idx],
-            "image_url": all_image_urls[idx]
-            # "similarity": float(similarities[idx])
+            "product_id": product_id,
+            "name": name,
+            "image_url": url
+            # "similarity": score
         })
-    return recommendations
\ No newline at end of file
+    return recommendations
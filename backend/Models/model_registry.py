@@ -0,0 +1,68 @@
+import time
+import threading
+
+
+class LazyModel:
+    """Loads a heavy model on first use or in a background warmup thread.
+
+    ``get()`` never blocks a request on a cold model: it returns None (and
+    starts loading in the background) until the loader has finished, so
+    callers can fall back to their SQL-only path. A loader that raises leaves
+    the model in the ``failed`` state, which is reported but not retried.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = 'cold'
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _load(self):
+        with self._lock:
+            if self.state in ('ready', 'failed'):
+                return self._value
+            self.state = 'loading'
+            started = time.time()
+            try:
+                self._value = self.loader()
+                self.state = 'ready'
+            except Exception as e:
+                print(f'Warning: {self.name} model disabled -', e)
+                self.error = str(e)
+                self.state = 'failed'
+            self.load_seconds = round(time.time() - started, 3)
+            return self._value
+
+    def start_background(self):
+        """Start loading in a daemon thread if nothing has started it yet."""
+        if self.state != 'cold' or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._load, name=f'warmup-{self.name}', daemon=True)
+        self._thread.start()
+
+    def get(self, wait=False):
+        """Return the loaded model, or None while it is cold/loading/failed."""
+        if self.state == 'ready':
+            return self._value
+        if wait:
+            return self._load()
+        self.start_background()
+        return None
+
+    def set(self, value):
+        """Replace the loaded value (e.g. after an admin-triggered rebuild)."""
+        with self._lock:
+            self._value = value
+            self.state = 'ready' if value is not None else 'cold'
+            self.error = None
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def status(self):
+        return {'state': self.state, 'error': self.error, 'load_seconds': self.load_seconds}
@@ -1,39 +1,259 @@
 import os
 import json
+import time
+import threading
 import numpy as np
 from sentence_transformers import SentenceTransformer
-from Utilities.Products import read_all_products_by_category
-from Models.user_feedback import get_exclude_list
+from Utilities.Products import iter_products_by_category, read_products_by_id
+from Models.user_feedback import AttributeIndex, get_exclude_mask
+from Models.embedding_cache import LRUCache
+from Models.nlp_store import EmbeddingStore
+from Utilities import Metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROGRESS_PATH = os.path.join(BASE_DIR, 'nlp_progress.json')
+# a "running" progress file not updated for this long belongs to a dead job
+STALE_JOB_SECONDS = 600
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_progress():
+    try:
+        with open(PROGRESS_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"status": "idle"}
+
+
+class ProgressReporter:
+    """Writes a re-index job's state to nlp_progress.json (like feature_progress.json)."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.data = {"status": "running", "stage": "loading_products", "total": 0, "processed": 0,
+                     "pid": os.getpid(), "started_at": self.started_at}
+        self._write()
+
+    def _write(self):
+        self.data["updated_at"] = time.time()
+        _write_json_atomic(PROGRESS_PATH, self.data)
+
+    def __call__(self, processed, total):
+        rate = processed / max(time.time() - self.started_at, 1e-6)
+        self.data.update(stage="encoding", processed=processed, total=total, texts_per_sec=round(rate, 1))
+        self._write()
+
+    def stage(self, name, **extra):
+        self.data.update(stage=name, **extra)
+        self._write()
+
+    def done(self, stats):
+        stats = dict(stats)
+        # "total" is the number of texts to encode; the catalog size is separate
+        stats["catalog"] = stats.pop("total")
+        self.data.update(status="done", stage="done", finished_at=time.time(), **stats)
+        self._write()
+
+    def error(self, message):
+        self.data.update(status="error", message=message, finished_at=time.time())
+        self._write()
+
+
+_job_lock = threading.Lock()
+
+
+def start_reindex(recommender):
+    """Run ``recommender.reindex()`` in a background thread, reporting to
+    nlp_progress.json. Returns False if a job is already running in this or
+    another worker."""
+    if not _job_lock.acquire(blocking=False):
+        return False
+    current = read_progress()
+    if current.get('status') == 'running' and time.time() - current.get('updated_at', 0) < STALE_JOB_SECONDS:
+        _job_lock.release()
+        return False
+    try:
+        reporter = ProgressReporter()
+    except Exception:
+        _job_lock.release()
+        raise
+
+    def run():
+        try:
+            reporter.done(recommender.reindex(reporter))
+        except Exception as e:
+            print('NLP reindex error', e)
+            reporter.error(str(e))
+        finally:
+            _job_lock.release()
+    threading.Thread(target=run, name='nlp-reindex', daemon=True).start()
+    return True
+
+
+class _Index:
+    """Products aligned with one store generation; swapped in as one reference
+    so a query never mixes two generations."""
+
+    def __init__(self, generation, products):
+        self.generation = generation
+        self.embeddings = generation.embeddings
+        # rows whose product was deleted after the generation was written
+        missing = [i for i, p in enumerate(products) if p is None]
+        self.products = [p if p is not None else {} for p in products]
+        self.missing = None
+        if missing:
+            self.missing = np.zeros(len(products), dtype=bool)
+            self.missing[missing] = True
+        # lowercased exclude_key column per key, built on first use
+        self.key_columns = {}
+        # (attribute, value) -> positions, for per-user feedback exclusion
+        self.attribute_index = AttributeIndex(self.products)
+
 
 class NLPRecommender:
     def __init__(self, model_name='all-MiniLM-L6-v2',
-                 products_path='Models/all_products.json',
-                 embeddings_path='Models/all_product_embeddings.npy'):
+                 store_path='Models/nlp_index',
+                 query_cache_size=1024,
+                 batch_size=256,
+                 check_interval=2.0):
         self.model = SentenceTransformer(model_name)
-        self.products_path = products_path
-        self.embeddings_path = embeddings_path
-        if os.path.exists(self.products_path) and os.path.exists(self.embeddings_path):
-            with open(self.products_path, 'r', encoding='utf-8') as f:
-                self.products = json.load(f)
-            self.embeddings = np.load(self.embeddings_path)
-            self.product_texts = [self._product_text(p) for p in self.products]
-        else:
-            self.products = self._load_products()
-            self.product_texts = [self._product_text(p) for p in self.products]
-            self.embeddings = self.model.encode(self.product_texts, show_progress_bar=True)
-            # Ensure the directory exists before saving
-            os.makedirs(os.path.dirname(self.products_path), exist_ok=True)
-            with open(self.products_path, 'w', encoding='utf-8') as f:
-                json.dump(self.products, f)
-            np.save(self.embeddings_path, self.embeddings)
+        self.batch_size = batch_size
+        self.check_interval = check_interval
+        # only products that are new or whose text changed are encoded; rows
+        # come back unit length, memory-mapped and in product order
+        self.store = EmbeddingStore(store_path, model_name)
+        self._index = None
+        self._last_check = time.monotonic()
+        self._reload_lock = threading.Lock()
+        self._reloading = False
+        self._query_cache = LRUCache(query_cache_size)
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+        self.sync_stats = self.reindex()
+
+    @property
+    def products(self):
+        return self._index.products
+
+    @property
+    def embeddings(self):
+        return self._index.embeddings
+
+    @property
+    def attribute_index(self):
+        return self._index.attribute_index
+
+    @property
+    def generation(self):
+        return self._index.generation.number
+
+    def reindex(self, progress=None):
+        """Sync the store with the products table and serve the result.
+
+        The current index keeps answering queries while new vectors are
+        encoded into the next generation's files; the swap is one reference
+        assignment. Other processes pick the new generation up in refresh().
+        """
+        products = self._load_products()
+        if progress is not None:
+            progress.stage("hashing", catalog=len(products))
+        generation, stats = self.store.sync(products, self._product_text, self._encode_batch,
+                                            self.batch_size, progress)
+        with self._reload_lock:
+            self._index = _Index(generation, products)
+        return stats
+
+    def refresh(self, force=False):
+        """Start loading a newer store generation written by another process.
+
+        Checked at most every ``check_interval`` seconds; the load runs in a
+        background thread and the previous generation serves until it is done.
+        Returns True if a reload was started.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        manifest = self.store.read_manifest()
+        if manifest is None or manifest.get('generation') == self.generation or \
+                manifest.get('model') != self.store.model_name:
+            return False
+        with self._reload_lock:
+            if self._reloading:
+                return False
+            self._reloading = True
+        threading.Thread(target=self._reload, name='nlp-reload', daemon=True).start()
+        return True
+
+    def _reload(self):
+        try:
+            generation = self.store.load()
+            if generation is None or generation.number == self.generation:
+                return
+            # products are read back in the generation's row order
+            rows = read_products_by_id(generation.ids.tolist())
+            index = _Index(generation, [rows.get(pid) for pid in generation.ids.tolist()])
+            with self._reload_lock:
+                if index.generation.number > self.generation:
+                    self._index = index
+        except Exception as e:
+            print('NLP index reload error', e)
+        finally:
+            with self._reload_lock:
+                self._reloading = False
+
+    @staticmethod
+    def _normalize(x):
+        norms = np.linalg.norm(x, axis=-1, keepdims=True)
+        return x / (norms + 1e-8)
+
+    def _encode_query(self, query):
+        emb = self._query_cache.get(query)
+        Metrics.cache_lookup('nlp_query', emb is not None)
+        if emb is not None:
+            self.query_cache_hits += 1
+            return emb
+        self.query_cache_misses += 1
+        Metrics.MODEL_CALLS.inc(model='sentence_transformer')
+        with Metrics.stage('nlp_encode'):
+            emb = self._normalize(np.asarray(self.model.encode([query])[0], dtype=np.float32))
+        self._query_cache.put(query, emb)
+        return emb
+
+    def _encode_batch(self, texts):
+        Metrics.MODEL_CALLS.inc(model='sentence_transformer')
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False)
+
+    @staticmethod
+    def _key_column(index, key):
+        """Dictionary-encoded lowercased values of ``key``: (codes array, value->code)."""
+        col = index.key_columns.get(key)
+        if col is None:
+            value_to_code = {}
+            codes = np.fromiter(
+                (value_to_code.setdefault(str(p.get(key, '')).lower(), len(value_to_code)) for p in index.products),
+                dtype=np.int64, count=len(index.products))
+            col = index.key_columns[key] = (codes, value_to_code)
+        return col
+
+    def _exclude_mask(self, index, exclude_list, exclude_key):
+        if not exclude_list:
+            return None
+        codes, value_to_code = self._key_column(index, exclude_key)
+        excluded = [value_to_code[v] for v in set(str(x).lower() for x in exclude_list) if v in value_to_code]
+        if not excluded:
+            return None
+        return np.isin(codes, excluded)
 
     def _load_products(self):
-        # Flatten all products from all categories into a single list
-        category_dict = read_all_products_by_category()
-        products = []
-        for plist in category_dict.values():
-            products.extend(plist)
-        return products
+        # All products, grouped by their stored inferred category
+        return [dict(p) for _, rows in iter_products_by_category() for p in rows]
 
     def _product_text(self, product):
         # Combine name, category, and other fields for richer embedding
@@ -43,24 +263,34 @@ class NLPRecommender:
         return f"{name} {category} {desc}".strip()
 
     def nlp_recommend(self, query, top_k=5, exclude_list=None, exclude_key='name', user_id=None, use_user_feedback=True):
-        # If user_id is provided, get exclude_list from user_feedback
+        self.refresh()
+        # one generation for the whole query, even if a swap happens meanwhile
+        index = self._index
+        query_emb = self._encode_query(query)
+        with Metrics.stage('nlp_similarity'):
+            sims = index.embeddings @ query_emb
+        Metrics.ROWS_SCANNED.inc(len(sims), source='nlp_index')
+        mask = self._exclude_mask(index, exclude_list, exclude_key)
+        # If user_id is provided, also exclude what the user's feedback rules out
         if user_id and use_user_feedback:
-            exclude_list = get_exclude_list(user_id, all_products=self.products)
-        query_emb = self.model.encode([query])[0]
-        sims = np.dot(self.embeddings, query_emb) / (
-            np.linalg.norm(self.embeddings, axis=1) * np.linalg.norm(query_emb) + 1e-8)
-        top_idx = np.argsort(sims)[::-1]
-        results = []
-        exclude_set = set(x.lower() for x in exclude_list) if exclude_list else set()
-        for i in top_idx:
-            prod = self.products[i]
-            prod_val = str(prod.get(exclude_key, '')).lower()
-            if prod_val in exclude_set:
-                continue
-            results.append(prod)
-            if len(results) >= top_k:
-                break
-        return results
+            user_mask = get_exclude_mask(user_id, index.attribute_index)
+            mask = user_mask if mask is None else (mask | user_mask)
+        if index.missing is not None:
+            mask = index.missing if mask is None else (mask | index.missing)
+        if mask is not None:
+            sims = np.where(mask, -np.inf, sims)
+            available = len(sims) - int(mask.sum())
+        else:
+            available = len(sims)
+        k = min(top_k, available)
+        if k <= 0:
+            return []
+        if k < len(sims):
+            top_idx = np.argpartition(-sims, k - 1)[:k]
+        else:
+            top_idx = np.arange(len(sims))
+        top_idx = top_idx[np.argsort(-sims[top_idx])][:k]
+        return [index.products[i] for i in top_idx]
 
 if __name__ == "__main__":
     recommender = NLPRecommender()
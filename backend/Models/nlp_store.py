@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # no cross-process lock on Windows; single worker there
+    fcntl = None
+
+# Sentence embeddings of the catalog, keyed by product id and a hash of the
+# text that was embedded. A sync encodes only new products and products whose
+# text changed, copies every other vector from the previous generation and
+# leaves deleted products out, so each generation is compact. A generation is
+# three files: the unit-length float32 matrix (memory-mapped on load), and the
+# ids and text hashes of its rows. manifest.json names the live generation and
+# is replaced last, so readers always see a complete one.
+
+MANIFEST = 'manifest.json'
+HASH_BYTES = 16
+COPY_CHUNK = 4096
+
+
+def text_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=HASH_BYTES).digest()
+
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / (norms + 1e-8)
+
+
+class Generation:
+    """One immutable generation: ``embeddings[i]`` belongs to ``ids[i]``."""
+
+    def __init__(self, number, embeddings, ids, hashes, model):
+        self.number = number
+        self.embeddings = embeddings
+        self.ids = ids
+        self.hashes = hashes
+        self.model = model
+        # id index: positions of ids in sorted order, for searchsorted lookups
+        self._order = np.argsort(ids, kind='stable')
+        self._sorted_ids = ids[self._order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.embeddings.shape[1] if self.embeddings.ndim == 2 else 0
+
+    def rows(self, ids):
+        """Row of each id in ``ids`` (an int64 array), -1 where absent."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self._sorted_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self._sorted_ids, ids)
+        pos_clipped = np.minimum(pos, len(self._sorted_ids) - 1)
+        found = self._sorted_ids[pos_clipped] == ids
+        return np.where(found, self._order[pos_clipped], -1)
+
+    def row(self, product_id):
+        r = int(self.rows([product_id])[0])
+        return None if r < 0 else r
+
+
+class EmbeddingStore:
+    """Incrementally maintained, memory-mapped embedding matrix in ``path``."""
+
+    def __init__(self, path, model_name):
+        self.path = path
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self.current = None
+        self.load()
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def read_manifest(self):
+        try:
+            with open(self._file(MANIFEST), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load(self, retries=3):
+        """(Re)open the generation named by the manifest; returns it or None."""
+        for _ in range(retries):
+            manifest = self.read_manifest()
+            if manifest is None:
+                self.current = None
+                return None
+            try:
+                generation = self._open(manifest)
+            except FileNotFoundError:
+                # a sync replaced the manifest and removed this generation
+                # between our two reads; read the new manifest
+                continue
+            self.current = generation
+            return generation
+        return self.current
+
+    def _open(self, manifest):
+        emb_path = self._file(manifest['embeddings'])
+        # numpy cannot map an empty file
+        embeddings = np.load(emb_path, mmap_mode='r' if manifest['count'] else None)
+        with np.load(self._file(manifest['keys'])) as keys:
+            ids, hashes = keys['ids'], keys['hashes']
+        if not (len(embeddings) == len(ids) == len(hashes) == manifest['count']):
+            raise ValueError(f'NLP embedding store generation {manifest["generation"]} is inconsistent')
+        return Generation(manifest['generation'], embeddings, ids, hashes, manifest.get('model'))
+
+    def _locked(self):
+        """Exclusive lock across processes, so concurrent workers sync once."""
+        os.makedirs(self.path, exist_ok=True)
+        handle = open(self._file('.lock'), 'w')
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def sync(self, products, text_fn, encode_fn, batch_size=256, progress=None):
+        """Bring the store in line with ``products`` (in that row order).
+
+        ``text_fn(product)`` gives the text to embed and ``encode_fn(texts)``
+        its vectors. ``progress(encoded, to_encode)`` is called after each
+        batch. Returns the resulting generation and counts of rows reused,
+        encoded and removed.
+        """
+        with self._lock, self._locked():
+            old = self.load()
+            if old is not None and old.model != self.model_name:
+                old = None
+            ids = np.fromiter((p['id'] for p in products), dtype=np.int64, count=len(products))
+            hashes = np.array([text_hash(text_fn(p)) for p in products], dtype=f'S{HASH_BYTES}')
+            if old is not None:
+                rows = old.rows(ids)
+                reuse = rows >= 0
+                reuse[reuse] = old.hashes[rows[reuse]] == hashes[reuse]
+            else:
+                rows = np.full(len(ids), -1, dtype=np.int64)
+                reuse = np.zeros(len(ids), dtype=bool)
+            stats = {'total': len(ids), 'reused': int(reuse.sum()), 'encoded': int((~reuse).sum()),
+                     'removed': len(old) - int(np.unique(rows[rows >= 0]).size) if old is not None else 0,
+                     'generation': old.number if old is not None else 0}
+            if old is not None and stats['encoded'] == 0 and len(old) == len(ids) and \
+                    np.array_equal(rows, np.arange(len(ids))):
+                return old, stats
+            generation = self._write(old, ids, hashes, rows, reuse, products, text_fn, encode_fn,
+                                     batch_size, progress)
+            stats['generation'] = generation.number
+            return generation, stats
+
+    def _write(self, old, ids, hashes, rows, reuse, products, text_fn, encode_fn, batch_size, progress):
+        number = (old.number if old is not None else self._last_generation()) + 1
+        emb_name, keys_name = f'embeddings-{number}.npy', f'keys-{number}.npz'
+        tmp_emb = self._file(f'{emb_name}.{os.getpid()}.tmp')
+        out = None
+        if reuse.any():
+            out = np.lib.format.open_memmap(tmp_emb, mode='w+', dtype=np.float32, shape=(len(ids), old.dim))
+            positions = np.flatnonzero(reuse)
+            for start in range(0, len(positions), COPY_CHUNK):
+                block = positions[start:start + COPY_CHUNK]
+                out[block] = old.embeddings[rows[block]]
+        todo = np.flatnonzero(~reuse)
+        for start in range(0, len(todo), batch_size):
+            block = todo[start:start + batch_size]
+            vectors = _normalize(np.asarray(encode_fn([text_fn(products[i]) for i in block]), dtype=np.float32))
+            if out is None:
+                out = np.lib.format.open_memmap(tmp_emb, mode='w+', dtype=np.float32,
+                                                shape=(len(ids), vectors.shape[1]))
+            out[block] = vectors
+            if progress is not None:
+                progress(min(start + batch_size, len(todo)), len(todo))
+        if out is None:
+            # an empty catalog; memmaps cannot be zero-sized
+            with open(tmp_emb, 'wb') as f:
+                np.save(f, np.zeros((0, old.dim if old is not None else 0), dtype=np.float32))
+        else:
+            out.flush()
+            del out
+        os.replace(tmp_emb, self._file(emb_name))
+        tmp_keys = self._file(f'{keys_name}.{os.getpid()}.tmp.npz')
+        np.savez(tmp_keys, ids=ids, hashes=hashes)
+        os.replace(tmp_keys, self._file(keys_name))
+        manifest = {'generation': number, 'model': self.model_name, 'count': int(len(ids)),
+                    'embeddings': emb_name, 'keys': keys_name, 'updated_at': time.time()}
+        tmp_manifest = self._file(f'{MANIFEST}.{os.getpid()}.tmp')
+        with open(tmp_manifest, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, self._file(MANIFEST))
+        # open readers keep their mapping of the old files after the unlink
+        self._remove_generations(keep=number)
+        self.current = self._open(manifest)
+        return self.current
+
+    def _generation_files(self):
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return []
+        out = []
+        for name in names:
+            stem, _, ext = name.partition('.')
+            prefix, _, number = stem.rpartition('-')
+            # includes the .tmp files of an interrupted sync
+            if prefix in ('embeddings', 'keys') and number.isdigit() and ext.startswith(('npy', 'npz')):
+                out.append((int(number), name))
+        return out
+
+    def _last_generation(self):
+        return max((n for n, _ in self._generation_files()), default=0)
+
+    def _remove_generations(self, keep):
+        for number, name in self._generation_files():
+            if number != keep:
+                try:
+                    os.remove(self._file(name))
+                except OSError:
+                    pass
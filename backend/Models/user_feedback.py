@@ -1,27 +1,19 @@
-import os
-import json
+import numpy as np
+from Models.feedback_store import get_store
+from Models.embedding_cache import LRUCache
 
-USER_FEEDBACK_PATH = 'Models/user_preference.json'
+REASON_ATTRS = ["category", "current_color", "style", "pattern", "brand"]
 
 
-def _load_feedback():
-    if os.path.exists(USER_FEEDBACK_PATH):
-        with open(USER_FEEDBACK_PATH, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-
-def _save_feedback(feedback):
-    os.makedirs(os.path.dirname(USER_FEEDBACK_PATH), exist_ok=True)
-    with open(USER_FEEDBACK_PATH, 'w', encoding='utf-8') as f:
-        json.dump(feedback, f)
+def _load_feedback(user_id):
+    return get_store().get_user(user_id)
 
 
 def _extract_reasons(product):
     # Extracts key attributes for dislike reasons
     # You can expand this list as needed
     reasons = {}
-    for attr in ["category", "current_color", "style", "pattern", "brand"]:
+    for attr in REASON_ATTRS:
         val = product.get(attr)
         if val:
             reasons[attr] = val
@@ -31,7 +23,7 @@ def _extract_reasons(product):
 def _extract_liked_reasons(product):
     # Extracts key attributes for like reasons
     reasons = {}
-    for attr in ["category", "current_color", "style", "pattern", "brand"]:
+    for attr in REASON_ATTRS:
         val = product.get(attr)
         if val:
             reasons[attr] = val
@@ -39,65 +31,106 @@ def _extract_liked_reasons(product):
 
 
 def add_liked_product(user_id, product, key='name'):
-    feedback = _load_feedback()
-    user_data = feedback.get(user_id, {"products": [], "reasons": {}, "liked_products": [], "liked_reasons": {}})
-    prod_val = product.get(key)
-    if prod_val and prod_val not in user_data.get("liked_products", []):
-        user_data.setdefault("liked_products", []).append(prod_val)
-    # Extract and store liked reasons
-    liked_reasons = _extract_liked_reasons(product)
-    for attr, val in liked_reasons.items():
-        if attr not in user_data.get("liked_reasons", {}):
-            user_data.setdefault("liked_reasons", {})[attr] = []
-        if val not in user_data["liked_reasons"][attr]:
-            user_data["liked_reasons"][attr].append(val)
-    feedback[user_id] = user_data
-    _save_feedback(feedback)
-
-
-def _concise_dislike_reasons(user_data):
-    # Remove dislike reasons that are also liked
-    concise = {}
-    for attr, vals in user_data.get("reasons", {}).items():
-        liked_vals = set(user_data.get("liked_reasons", {}).get(attr, []))
-        concise[attr] = [v for v in vals if v not in liked_vals]
-    return concise
+    # one buffered insert per event; see Models/feedback_store.py
+    get_store().record(user_id, 'liked', product.get(key), _extract_liked_reasons(product))
 
 
 def add_disliked_product(user_id, product, key='name'):
-    feedback = _load_feedback()
-    user_data = feedback.get(user_id, {"products": [], "reasons": {}, "liked_products": [], "liked_reasons": {}})
-    prod_val = product.get(key)
-    if prod_val and prod_val not in user_data["products"]:
-        user_data["products"].append(prod_val)
-    # Extract and store reasons
-    reasons = _extract_reasons(product)
-    for attr, val in reasons.items():
-        if attr not in user_data["reasons"]:
-            user_data["reasons"][attr] = []
-        if val not in user_data["reasons"][attr]:
-            user_data["reasons"][attr].append(val)
-    # Concise dislike reasons by removing overlaps with liked reasons
-    user_data["reasons"] = _concise_dislike_reasons(user_data)
-    feedback[user_id] = user_data
-    _save_feedback(feedback)
+    # dislike reasons that the user also liked are dropped when read back
+    get_store().record(user_id, 'disliked', product.get(key), _extract_reasons(product))
+
+
+class AttributeIndex:
+    """Inverted index over a product list for feedback-based exclusion.
+
+    Maps (attribute, value) pairs and lowercased ``key`` values to numpy
+    arrays of product positions, so a user's exclusion set is a few array
+    unions instead of a scan over every product and attribute. Masks of the
+    ``mask_cache_size`` most recent users are cached until that user's
+    feedback version changes.
+    """
+
+    def __init__(self, products, key='name', attrs=REASON_ATTRS, mask_cache_size=1024):
+        self.products = products
+        self.key = key
+        postings = {}
+        keys = {}
+        for i, prod in enumerate(products):
+            for attr in attrs:
+                val = prod.get(attr)
+                if val:
+                    postings.setdefault((attr, str(val)), []).append(i)
+            kv = prod.get(key)
+            if kv:
+                keys.setdefault(str(kv).lower(), []).append(i)
+        self.postings = {k: np.array(v, dtype=np.int64) for k, v in postings.items()}
+        self.key_postings = {k: np.array(v, dtype=np.int64) for k, v in keys.items()}
+        # user_id -> (feedback version, mask); each mask is one bool per product
+        self._masks = LRUCache(mask_cache_size)
+
+    def __len__(self):
+        return len(self.products)
+
+    def mask_for(self, user_data):
+        """Boolean mask of products excluded by a user's dislikes."""
+        mask = np.zeros(len(self.products), dtype=bool)
+        for prod_val in user_data.get("products", []):
+            pos = self.key_postings.get(str(prod_val).lower())
+            if pos is not None:
+                mask[pos] = True
+        for attr, vals in user_data.get("reasons", {}).items():
+            for val in vals:
+                pos = self.postings.get((attr, str(val)))
+                if pos is not None:
+                    mask[pos] = True
+        return mask
+
+    def user_mask(self, user_id):
+        version = get_store().version(user_id)
+        cached = self._masks.get(user_id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        user_data = _load_feedback(user_id)
+        mask = self.mask_for(user_data)
+        self._masks.put(user_id, (version, mask))
+        return mask
+
+
+_last_index = None
+
+
+def _index_for(all_products, key):
+    # reuse the index while callers keep passing the same catalog list
+    global _last_index
+    idx = _last_index
+    if idx is None or idx.products is not all_products or idx.key != key or len(idx) != len(all_products):
+        idx = _last_index = AttributeIndex(all_products, key=key)
+    return idx
+
+
+def get_exclude_mask(user_id, index):
+    """Boolean mask over ``index.products`` of items a user should not be shown."""
+    return index.user_mask(user_id)
 
 
 def get_exclude_list(user_id, recommender=None, expand_similar=False, top_k=3, key='name', all_products=None):
-    feedback = _load_feedback()
-    user_data = feedback.get(user_id, {"products": [], "reasons": {}})
+    user_data = _load_feedback(user_id)
     exclude_list = list(user_data["products"])
+    seen = set(exclude_list)
     # Exclude by reasons (attributes)
     if all_products:
-        for prod in all_products:
-            for attr, vals in user_data["reasons"].items():
-                if prod.get(attr) in vals and prod.get(key) not in exclude_list:
-                    exclude_list.append(prod.get(key))
+        mask = _index_for(all_products, key).user_mask(user_id)
+        for i in np.flatnonzero(mask):
+            val = all_products[i].get(key)
+            if val not in seen:
+                seen.add(val)
+                exclude_list.append(val)
     if expand_similar and recommender is not None:
         for prod_val in user_data["products"]:
             similar = recommender.recommend(prod_val, top_k=top_k)
             for sim_prod in similar:
                 sim_val = sim_prod.get(key)
-                if sim_val and sim_val not in exclude_list:
+                if sim_val and sim_val not in seen:
+                    seen.add(sim_val)
                     exclude_list.append(sim_val)
     return exclude_list
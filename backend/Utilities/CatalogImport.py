@@ -0,0 +1,206 @@
+import csv
+import time
+import queue
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from Utilities.Ingest import parse_price_num, row_hash, file_hash
+from Utilities.Tagging import tag
+
+# Offline import of the retailer CSV dumps in backend/Datasets. Every file has
+# a declared Adapter mapping its columns onto products; files are parsed in
+# worker processes that stream chunks of normalized rows back to this process,
+# which is the only SQLite writer. Run it with ``flask --app app import-catalog``.
+
+
+def _url_slug(url):
+    return (url or '').split('?')[0].rstrip('/').rsplit('/', 1)[-1]
+
+
+class Adapter:
+    """Column mapping for one retailer file.
+
+    ``key`` names the column holding the retailer's product id; retailers
+    without one are keyed by the last path segment of ``url``. Empty and
+    ``N/A`` values are treated as missing.
+    """
+
+    def __init__(self, retailer, name, price, image, key=None, url=None, color=None, category=None):
+        self.retailer = retailer
+        self.name = name
+        self.price = price
+        self.image = image
+        self.key = key
+        self.url = url
+        self.color = color
+        self.category = category
+
+    @staticmethod
+    def _get(row, col):
+        val = (row.get(col) or '').strip() if col else ''
+        return '' if val == 'N/A' else val
+
+    def parse(self, row):
+        """Return ``(source_key, name, price, image, category, color, location)`` or None."""
+        key = self._get(row, self.key) if self.key else _url_slug(self._get(row, self.url))
+        name = self._get(row, self.name)
+        if not key or not name:
+            return None
+        return (f'{self.retailer}:{key}', name, self._get(row, self.price), self._get(row, self.image),
+                self._get(row, self.category), self._get(row, self.color), '')
+
+
+ADAPTERS = {
+    'alo_yoga_products.csv': Adapter('alo_yoga', name='name', price='price', image='image_url',
+                                     url='product_url', color='current_color'),
+    'edikted_products.csv': Adapter('edikted', name='name', price='current_price', image='image_url',
+                                    key='product_id', color='colors'),
+    'gymshark_products.csv': Adapter('gymshark', name='name', price='price', image='image_url',
+                                     key='product_id', color='color'),
+    'nakd_products.csv': Adapter('nakd', name='name', price='price', image='image_url',
+                                 key='product_id', color='variant', category='category'),
+    'princess_polly.csv': Adapter('princess_polly', name='title', price='price', image='image_url',
+                                  url='product_url'),
+    'vuori_products.csv': Adapter('vuori', name='name', price='price', image='image_url',
+                                  key='product_id', color='color'),
+}
+
+# rows whose source_key is new but whose image matches a product imported
+# before source keys existed take over that product instead of duplicating it
+ADOPT_SQL = 'UPDATE products SET source_key = ? WHERE source_key IS NULL AND image = ?'
+
+UPSERT_SQL = '''
+INSERT INTO products(source_key, name, price, image, category, color, location, price_num, row_hash,
+                     inferred_category, gender)
+VALUES (?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(source_key) DO UPDATE SET
+    name = excluded.name, price = excluded.price, image = excluded.image,
+    category = excluded.category, color = excluded.color, location = excluded.location,
+    price_num = excluded.price_num, row_hash = excluded.row_hash,
+    inferred_category = excluded.inferred_category, gender = excluded.gender
+WHERE products.row_hash IS NOT excluded.row_hash
+'''
+
+
+def _parse_file(path, out, chunk_size, stop):
+    """Worker: stream one file's normalized rows onto ``out`` in chunks,
+    giving up early once ``stop`` is set."""
+    adapter = ADAPTERS[path.name]
+    chunk, rows, skipped = [], 0, 0
+    try:
+        with open(path, newline='', encoding='utf-8') as fh:
+            for row in csv.DictReader(fh):
+                rec = adapter.parse(row)
+                if rec is None:
+                    skipped += 1
+                    continue
+                source_key, name, price, image, category, color, location = rec
+                # tagging happens here, in the worker processes
+                chunk.append(rec + (parse_price_num(price), row_hash(name, price, image, category, color, location))
+                             + tag(name, category))
+                if len(chunk) >= chunk_size:
+                    if stop.is_set():
+                        return
+                    out.put(('rows', path.name, chunk))
+                    rows += len(chunk)
+                    chunk = []
+        if chunk:
+            out.put(('rows', path.name, chunk))
+            rows += len(chunk)
+        out.put(('done', path.name, {'rows': rows, 'skipped': skipped}))
+    except Exception as e:
+        out.put(('error', path.name, str(e)))
+
+
+def _write_chunk(db, chunk):
+    db.executemany(ADOPT_SQL, [(r[0], r[3]) for r in chunk if r[3]])
+    return db.executemany(UPSERT_SQL, chunk).rowcount
+
+
+def import_catalog(db, datasets_dir, files=None, workers=None, force=False, chunk_size=2000, log=print):
+    """Import the retailer CSVs in ``datasets_dir`` into products.
+
+    Files whose content hash matches their last import are skipped unless
+    ``force``; files without an adapter are reported and skipped. Every chunk
+    is committed on its own so the write lock is only held briefly (the
+    upsert makes a re-run of a partly imported file idempotent); a file is
+    marked imported once all of its chunks are in. Returns per-file stats.
+    """
+    paths = sorted(datasets_dir.glob('*.csv')) if not files else [datasets_dir / f for f in files]
+    todo = {}
+    stats = {}
+    for path in paths:
+        if path.name not in ADAPTERS:
+            log(f'{path.name}: no adapter declared, skipped')
+            stats[path.name] = {'status': 'no_adapter'}
+            continue
+        digest = file_hash(path)
+        row = db.execute('SELECT sha1 FROM imported_files WHERE filename = ?', (path.name,)).fetchone()
+        if row and row[0] == digest and not force:
+            log(f'{path.name}: unchanged, skipped')
+            stats[path.name] = {'status': 'unchanged'}
+            continue
+        todo[path.name] = (path, digest)
+        stats[path.name] = {'status': 'pending', 'rows': 0, 'written': 0}
+    if not todo:
+        return stats
+
+    started = time.time()
+    total = 0
+    with multiprocessing.Manager() as manager:
+        out = manager.Queue(maxsize=64)
+        stop = manager.Event()
+        with ProcessPoolExecutor(max_workers=workers or min(len(todo), multiprocessing.cpu_count())) as pool:
+            futures = [pool.submit(_parse_file, path, out, chunk_size, stop) for path, _ in todo.values()]
+            try:
+                total = _consume(db, out, todo, stats, started, log)
+            except BaseException:
+                db.rollback()
+                _abandon(futures, out, stop)
+                raise
+    elapsed = time.time() - started
+    log(f'Imported {total} rows from {len(todo)} file(s) in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.0f} rows/s)')
+    return stats
+
+
+def _abandon(futures, out, stop):
+    """Stop the workers after a failed write: cancel the files not started
+    yet and drain ``out`` so none stays blocked on a full queue."""
+    stop.set()
+    for f in futures:
+        f.cancel()
+    while not all(f.done() for f in futures):
+        try:
+            out.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+
+def _consume(db, out, todo, stats, started, log):
+    """Write the chunks the workers send until every file is done or failed."""
+    total = 0
+    remaining = len(todo)
+    while remaining:
+        kind, name, payload = out.get()
+        if kind == 'rows':
+            stats[name]['written'] += _write_chunk(db, payload)
+            db.commit()
+            stats[name]['rows'] += len(payload)
+            total += len(payload)
+            elapsed = max(time.time() - started, 1e-6)
+            log(f'{name}: {stats[name]["rows"]} rows | total {total} rows, {total / elapsed:.0f} rows/s')
+            continue
+        remaining -= 1
+        if kind == 'error':
+            # rows already written stay (the upsert is idempotent);
+            # the file is not marked imported so the next run retries it
+            stats[name] = {'status': 'error', 'message': payload}
+            log(f'{name}: failed - {payload}')
+            continue
+        path, digest = todo[name]
+        db.execute('INSERT OR REPLACE INTO imported_files(filename, mtime, sha1) VALUES (?,?,?)',
+                   (name, path.stat().st_mtime, digest))
+        db.commit()
+        stats[name].update(status='imported', skipped=payload['skipped'])
+        log(f'{name}: done, {stats[name]["rows"]} rows ({stats[name]["written"]} written, '
+            f'{payload["skipped"]} skipped)')
+    return total
@@ -0,0 +1,170 @@
+import threading
+import numpy as np
+from Utilities import Metrics
+
+# Immutable, columnar copy of the products table for the hot read paths.
+# Filters become boolean masks over NumPy columns and only the rows of the
+# final page are turned back into dicts. A SnapshotHolder rebuilds it in the
+# background when the 'catalog' version changes and swaps the reference in
+# one assignment, so readers always see a complete snapshot.
+
+PRODUCT_FIELDS = ('id', 'name', 'price', 'image', 'category', 'color', 'location', 'price_num')
+ENCODED_FIELDS = ('category', 'inferred_category', 'color', 'location', 'gender')
+
+
+class EncodedColumn:
+    """Dictionary-encoded text column: int32 codes plus the distinct values."""
+
+    def __init__(self, values):
+        self.values = []
+        self.lookup = {}
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, v in enumerate(values):
+            code = self.lookup.get(v)
+            if code is None:
+                code = self.lookup[v] = len(self.values)
+                self.values.append(v)
+            codes[i] = code
+        self.codes = codes
+
+    def equals(self, value):
+        code = self.lookup.get(value)
+        if code is None:
+            return np.zeros(len(self.codes), dtype=bool)
+        return self.codes == code
+
+    def __getitem__(self, row):
+        return self.values[self.codes[row]]
+
+
+class CatalogSnapshot:
+    def __init__(self, rows, version=None):
+        self.version = version
+        rows = sorted(rows, key=lambda r: r['id'])
+        self.ids = np.array([r['id'] for r in rows], dtype=np.int64)
+        self.price_num = np.array([np.nan if r['price_num'] is None else r['price_num'] for r in rows],
+                                  dtype=np.float64)
+        self.name = [r['name'] for r in rows]
+        self.price = [r['price'] for r in rows]
+        self.image = [r['image'] for r in rows]
+        self.encoded = {f: EncodedColumn([r[f] for r in rows]) for f in ENCODED_FIELDS}
+
+    @classmethod
+    def load(cls, conn):
+        """Read products and the catalog version in one read transaction."""
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute("SELECT version FROM catalog_version WHERE name = 'catalog'").fetchone()
+            cur = conn.execute(f"SELECT {', '.join(PRODUCT_FIELDS)}, inferred_category, gender FROM products")
+            cols = [d[0] for d in cur.description]
+            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        finally:
+            conn.rollback()
+        return cls(rows, version=row[0] if row else None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def mask(self, category=None, color=None, location=None, min_price=None, max_price=None, gender=None):
+        """Boolean mask of rows matching the filters (same semantics as Search.build_filters;
+        ``category`` matches the inferred category)."""
+        m = np.ones(len(self.ids), dtype=bool)
+        Metrics.ROWS_SCANNED.inc(len(m), source='snapshot')
+        for field, value in (('inferred_category', category), ('color', color), ('location', location),
+                             ('gender', gender)):
+            if value:
+                m &= self.encoded[field].equals(value)
+        # NaN compares False, matching SQL's NULL semantics
+        if min_price is not None:
+            m &= self.price_num >= min_price
+        if max_price is not None:
+            m &= self.price_num <= max_price
+        return m
+
+    def rows_for(self, ids):
+        """Row positions of ``ids`` (in order); unknown ids are dropped."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.ids) or not len(ids):
+            return np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self.ids, ids)
+        pos[pos >= len(self.ids)] = 0
+        return pos[self.ids[pos] == ids]
+
+    def select(self, ids, mask=None):
+        """Row positions of ``ids`` (in order) that exist and, if given, pass ``mask``."""
+        rows = self.rows_for(ids)
+        return rows if mask is None else rows[mask[rows]]
+
+    def materialize(self, rows):
+        out = []
+        for r in rows:
+            price_num = self.price_num[r]
+            out.append({
+                'id': int(self.ids[r]),
+                'name': self.name[r],
+                'price': self.price[r],
+                'image': self.image[r],
+                'category': self.encoded['category'][r],
+                'inferred_category': self.encoded['inferred_category'][r],
+                'color': self.encoded['color'][r],
+                'location': self.encoded['location'][r],
+                'price_num': None if np.isnan(price_num) else float(price_num),
+            })
+        return out
+
+    def id_page(self, mask, after_id=None, limit=50):
+        """First ``limit`` matching rows in id order after ``after_id``, plus whether more follow."""
+        if after_id is not None:
+            mask = mask & (self.ids > after_id)
+        rows = np.flatnonzero(mask)[:limit + 1]
+        return self.materialize(rows[:limit]), len(rows) > limit
+
+
+class SnapshotHolder:
+    """Keeps the current CatalogSnapshot for this process.
+
+    ``get()`` builds the first snapshot synchronously; afterwards a version
+    bump triggers a rebuild in a background thread while the old snapshot
+    keeps serving.
+    """
+
+    def __init__(self, pool, versions):
+        self.pool = pool
+        self.versions = versions
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._building = False
+
+    def _build(self):
+        with self.pool.connection() as conn:
+            snap = CatalogSnapshot.load(conn)
+        self._snapshot = snap
+        return snap
+
+    def _build_in_background(self):
+        try:
+            self._build()
+        except Exception as e:
+            print('catalog snapshot rebuild failed', e)
+        finally:
+            self._building = False
+
+    def refresh(self):
+        """Rebuild now (e.g. right after this process ran an ingest)."""
+        with self._lock:
+            return self._build()
+
+    def get(self):
+        snap = self._snapshot
+        if snap is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._build()
+                return self._snapshot
+        current = self.versions.current().get('catalog')
+        if current != snap.version and not self._building:
+            with self._lock:
+                if not self._building:
+                    self._building = True
+                    threading.Thread(target=self._build_in_background, name='catalog-snapshot', daemon=True).start()
+        return snap
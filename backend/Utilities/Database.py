@@ -0,0 +1,98 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+from urllib.parse import quote
+from Utilities.Metrics import connection_factory
+
+# The main backend/app.db; APP_DB_PATH points the app at another file
+# (e.g. a synthetic benchmark catalog)
+DB_PATH = os.getenv('APP_DB_PATH') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.db')
+
+CACHE_KB = int(os.getenv('SQLITE_CACHE_KB', '32768'))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+# prepared statements kept per connection; pooled connections keep them warm
+CACHED_STATEMENTS = int(os.getenv('SQLITE_CACHED_STATEMENTS', '256'))
+BUSY_TIMEOUT = 30
+
+
+def configure(conn, readonly=False):
+    """Apply the per-connection tuning pragmas (WAL itself is persistent)."""
+    if not readonly:
+        conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_KB}')
+    conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    if readonly:
+        conn.execute('PRAGMA query_only=1')
+    return conn
+
+
+class ConnectionPool:
+    """Reusable, pre-tuned SQLite connections for one process.
+
+    Connections are handed out LIFO so the most recently used (warmest page
+    cache and statement cache) goes out first; at most ``maxsize`` idle ones
+    are kept. A read-only pool opens the file with ``mode=ro`` — in WAL mode
+    those readers never wait on the swipe writer. After a fork (gunicorn
+    workers) the inherited connections are dropped and new ones are opened.
+    """
+
+    def __init__(self, db_path=DB_PATH, readonly=False, maxsize=16):
+        self.db_path = str(db_path)
+        self.readonly = readonly
+        self.maxsize = maxsize
+        self._idle = queue.LifoQueue()
+        self._pid = os.getpid()
+        self.opened = 0
+
+    def _connect(self):
+        if self.readonly:
+            target, uri = f'file:{quote(self.db_path)}?mode=ro', True
+        else:
+            target, uri = self.db_path, False
+        conn = sqlite3.connect(target, uri=uri, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=CACHED_STATEMENTS, factory=connection_factory())
+        conn.row_factory = sqlite3.Row
+        self.opened += 1
+        return configure(conn, self.readonly)
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+
+    def acquire(self):
+        self._check_fork()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if os.getpid() != self._pid or self._idle.qsize() >= self.maxsize:
+            conn.close()
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+writers = ConnectionPool(DB_PATH)
+readers = ConnectionPool(DB_PATH, readonly=True)
@@ -0,0 +1,199 @@
+import re
+import json
+import hashlib
+from Utilities.Tagging import tag
+
+# Catalog ingest for init_db (data/products.json; retailer CSV dumps are
+# loaded offline by Utilities/CatalogImport.py). Whole files are skipped when their content hash
+# matches the last import, and rows are written with an UPSERT that only
+# touches products whose row hash changed, so an unchanged catalog costs a
+# few file hashes and nothing else. New and changed rows are tagged
+# (Utilities/Tagging.py) on the way in. Triggers mirror products into the legacy
+# items table, so only rows that actually changed are copied there.
+
+_PRICE_RE = re.compile(r"[0-9]+(?:\.[0-9]+)?")
+
+INGEST_DDL = """
+CREATE TABLE IF NOT EXISTS imported_files (filename TEXT PRIMARY KEY, mtime REAL);
+CREATE INDEX IF NOT EXISTS idx_products_image ON products(image);
+CREATE INDEX IF NOT EXISTS idx_products_name_price ON products(name, price);
+"""
+
+ITEMS_SYNC_DDL = """
+CREATE TRIGGER IF NOT EXISTS trg_products_items_insert AFTER INSERT ON products BEGIN
+    INSERT OR REPLACE INTO items(id, name, price, image) VALUES (NEW.id, NEW.name, NEW.price, NEW.image);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_items_update AFTER UPDATE OF name, price, image ON products BEGIN
+    UPDATE items SET name = NEW.name, price = NEW.price, image = NEW.image WHERE id = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_items_delete AFTER DELETE ON products BEGIN
+    DELETE FROM items WHERE id = OLD.id;
+END;
+"""
+
+UPSERT_SQL = '''
+INSERT INTO products(id, name, price, image, category, color, location, price_num, row_hash,
+                     inferred_category, gender)
+VALUES (?,?,?,?,?,?,?,?,?,?,?)
+ON CONFLICT(id) DO UPDATE SET
+    name = excluded.name, price = excluded.price, image = excluded.image,
+    category = excluded.category, color = excluded.color, location = excluded.location,
+    price_num = excluded.price_num, row_hash = excluded.row_hash,
+    inferred_category = excluded.inferred_category, gender = excluded.gender
+WHERE products.row_hash IS NOT excluded.row_hash
+'''
+
+
+def parse_price_num(val):
+    """First number in a price string ("$1,299.00" -> 1299.0), or None."""
+    if val is None:
+        return None
+    s = str(val).strip()
+    # remove common currency symbols and commas
+    s = s.replace('$', '').replace('₹', '').replace('£', '').replace(',', '')
+    m = _PRICE_RE.search(s)
+    return float(m.group(0)) if m else None
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def row_hash(name, price, image, category, color, location):
+    fields = (name, price, image, category, color, location)
+    return hashlib.sha1('\x1f'.join('' if v is None else str(v) for v in fields).encode('utf-8')).hexdigest()
+
+
+def _add_column(db, table, column, decl):
+    cols = [r[1] for r in db.execute(f'PRAGMA table_info({table})')]
+    if column in cols:
+        return False
+    db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+    return True
+
+
+def init_ingest(db):
+    """Create the bookkeeping table, dedup indexes and items triggers.
+
+    The first time the triggers are installed items is rebuilt from products
+    once; after that it only changes when a product row does.
+    """
+    db.executescript(INGEST_DDL)
+    _add_column(db, 'products', 'row_hash', 'TEXT')
+    _add_column(db, 'imported_files', 'sha1', 'TEXT')
+    # retailer:sku natural key used by the offline CSV import (Utilities/CatalogImport.py)
+    _add_column(db, 'products', 'source_key', 'TEXT')
+    db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_products_source_key ON products(source_key)')
+    existed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'trg_products_items_insert'").fetchone()
+    db.executescript(ITEMS_SYNC_DDL)
+    if not existed:
+        db.execute('DELETE FROM items')
+        db.execute('INSERT INTO items(id, name, price, image) SELECT id, name, price, image FROM products')
+    db.commit()
+
+
+def _int_or_none(val):
+    try:
+        return int(val) if str(val).strip() != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+def json_rows(path):
+    """Rows of data/products.json as (id, name, price, image, category, color, location)."""
+    with open(path, 'r') as f:
+        items = json.load(f)
+    for p in items:
+        yield (p.get('id'), p.get('name'), p.get('price'), p.get('image'),
+               p.get('category'), p.get('color'), p.get('location'))
+
+
+class IdResolver:
+    """Assigns ids to rows without one: reuse the product with the same image,
+    else the same name+price, else allocate the next free id. Rows assigned
+    in this run are remembered, so a file may repeat a product before the
+    batch holding it has been written."""
+
+    def __init__(self, db):
+        self.db = db
+        self.next_id = (db.execute('SELECT IFNULL(MAX(id), 0) FROM products').fetchone()[0] or 0) + 1
+        self.by_image = {}
+        self.by_name_price = {}
+
+    def resolve(self, name, price, image):
+        pid = None
+        if image:
+            pid = self.by_image.get(image)
+            if pid is None:
+                row = self.db.execute('SELECT id FROM products WHERE image = ? LIMIT 1', (image,)).fetchone()
+                pid = row[0] if row else None
+        if pid is None and name:
+            pid = self.by_name_price.get((name, price))
+            if pid is None:
+                row = self.db.execute('SELECT id FROM products WHERE name = ? AND price = ? LIMIT 1',
+                                      (name, price)).fetchone()
+                pid = row[0] if row else None
+        if pid is None:
+            pid = self.next_id
+            self.next_id += 1
+        self.remember(pid, name, price, image)
+        return pid
+
+    def remember(self, pid, name, price, image):
+        if pid >= self.next_id:
+            self.next_id = pid + 1
+        if image:
+            self.by_image.setdefault(image, pid)
+        if name:
+            self.by_name_price.setdefault((name, price), pid)
+
+
+def _records(rows, resolver, default_names):
+    for pid, name, price, image, category, color, location in rows:
+        if pid is None:
+            pid = resolver.resolve(name, price, image)
+        else:
+            resolver.remember(pid, name, price, image)
+        if default_names:
+            name = name or f'Product {pid}'
+        yield (pid, name, price, image, category, color, location, parse_price_num(price),
+               row_hash(name, price, image, category, color, location)) + tag(name, category)
+
+
+def ingest_sources(db, sources, batch_size=1000):
+    """Upsert every changed source file into products in one transaction.
+
+    ``sources`` is a list of ``(path, row_reader, default_names)``. Returns
+    ``{'files_changed': n, 'files_skipped': n, 'rows_written': n}``.
+    """
+    stats = {'files_changed': 0, 'files_skipped': 0, 'rows_written': 0}
+    resolver = None
+    try:
+        for path, reader, default_names in sources:
+            digest = file_hash(path)
+            row = db.execute('SELECT sha1 FROM imported_files WHERE filename = ?', (path.name,)).fetchone()
+            if row and row[0] == digest:
+                stats['files_skipped'] += 1
+                continue
+            if resolver is None:
+                resolver = IdResolver(db)
+            # several rows of a file can resolve to one product; keep the
+            # last so an unchanged product is not rewritten back and forth
+            records = {}
+            for rec in _records(reader(path), resolver, default_names):
+                records[rec[0]] = rec
+            records = list(records.values())
+            for i in range(0, len(records), batch_size):
+                stats['rows_written'] += db.executemany(UPSERT_SQL, records[i:i + batch_size]).rowcount
+            db.execute('INSERT OR REPLACE INTO imported_files(filename, mtime, sha1) VALUES (?,?,?)',
+                       (path.name, path.stat().st_mtime, digest))
+            stats['files_changed'] += 1
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return stats
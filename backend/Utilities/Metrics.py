@@ -0,0 +1,257 @@
+import os
+import re
+import time
+import bisect
+import random
+import sqlite3
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# In-process latency histograms and counters, exported in the Prometheus text
+# format by GET /metrics. Every process (each gunicorn worker) keeps its own
+# registry; scrape each worker or aggregate by instance. METRICS_ENABLED=0
+# turns the SQLite and stage timers into no-ops.
+ENABLED = os.getenv('METRICS_ENABLED', '1') in ('1', 'true', 'True')
+
+# seconds; from sub-millisecond SQLite reads up to slow image downloads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, '') for n in self.labels), 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f'{self.name}{_label_str(self.labels, key)} {v}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, **labels):
+        key = tuple(labels.get(n, '') for n in self.labels)
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((k, ([*s[0]], s[1], s[2])) for k, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ('+Inf',), counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else repr(float(bound))
+                lines.append(f'{self.name}_bucket{_label_str(self.labels + ("le",), key + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_label_str(self.labels, key)} {total}')
+            lines.append(f'{self.name}_count{_label_str(self.labels, key)} {count}')
+        return lines
+
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'Request latency by route.', ('route', 'method'))
+REQUESTS = Counter('http_requests_total', 'Requests by route and status code.', ('route', 'method', 'status'))
+STAGE_SECONDS = Histogram('stage_duration_seconds',
+                          'Time spent in one instrumented stage (image_download, image_preprocess, image_predict, '
+                          'image_similarity, nlp_encode, nlp_similarity, sqlite, sqlite_fetch).', ('stage',))
+CACHE_LOOKUPS = Counter('cache_lookups_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+MODEL_CALLS = Counter('model_calls_total', 'Calls into a model (inference batches).', ('model',))
+ROWS_SCANNED = Counter('rows_scanned_total', 'Rows read or scored, by source.', ('source',))
+METRICS = [REQUEST_SECONDS, REQUESTS, STAGE_SECONDS, CACHE_LOOKUPS, MODEL_CALLS, ROWS_SCANNED]
+
+
+@contextmanager
+def stage(name):
+    """Time a block as ``stage_duration_seconds{stage=name}``."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor that records statement and fetch time plus rows fetched."""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='sqlite')
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage='sqlite')
+
+    def _fetched(self, started, rows):
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='sqlite_fetch')
+        ROWS_SCANNED.inc(rows, source='sqlite')
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        return rows
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors (including ``conn.execute``) are TimedCursors."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def connection_factory():
+    return TimedConnection if ENABLED else sqlite3.Connection
+
+
+class SampledProfiler:
+    """cProfile a sample of requests and dump each profile to a ``.prof`` file.
+
+    ``start()`` arms it for the next ``requests`` sampled requests (each
+    request is sampled with probability ``rate``) or until ``seconds`` pass.
+    The dumps load in pstats, snakeviz or flameprof for flamegraphs.
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._rate = 1.0
+        self._until = 0.0
+        self._seq = 0
+        self.written = []
+
+    @property
+    def active(self):
+        return self._remaining > 0 and time.monotonic() < self._until
+
+    def start(self, requests=50, rate=1.0, seconds=300.0):
+        with self._lock:
+            self._remaining = int(requests)
+            self._rate = float(rate)
+            self._until = time.monotonic() + float(seconds)
+            self.written = []
+        return self.status()
+
+    def stop(self):
+        with self._lock:
+            self._remaining = 0
+        return self.status()
+
+    def status(self):
+        return {'active': self.active, 'remaining': self._remaining, 'rate': self._rate,
+                'seconds_left': round(max(self._until - time.monotonic(), 0.0), 1) if self.active else 0,
+                'out_dir': str(self.out_dir), 'written': list(self.written[-20:])}
+
+    def maybe_begin(self):
+        """Return an enabled Profile for this request, or None if not sampled."""
+        if not self.active or random.random() >= self._rate:
+            return None
+        with self._lock:
+            if self._remaining <= 0:
+                return None
+            self._remaining -= 1
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is already active on this thread
+            return None
+        return profile
+
+    def finish(self, profile, route):
+        profile.disable()
+        os.makedirs(self.out_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        path = os.path.join(self.out_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{seq}-{slug}.prof')
+        profile.dump_stats(path)
+        with self._lock:
+            self.written.append(os.path.basename(path))
+        return path
@@ -0,0 +1,36 @@
+import json
+import base64
+import binascii
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(state):
+    """Opaque, URL-safe token for a keyset position (a small JSON dict)."""
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of ``encode_cursor``; None/empty means "first page"."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        state = json.loads(raw)
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor(f'invalid cursor: {e}')
+    if not isinstance(state, dict):
+        raise InvalidCursor('invalid cursor')
+    return state
+
+
+def page_size(value, default, maximum):
+    """Parse a ``k`` query parameter, clamped to 1..maximum."""
+    try:
+        k = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(k, maximum))
@@ -1,77 +1,71 @@
-import os
-import sqlite3
+from itertools import groupby
+from Utilities.Database import readers
+from Utilities import Tagging
 
-# Always use the main backend/app.db, not Utilities/app.db
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.db')
+# Readers over the inferred_category column (indexed, maintained at ingest by
+# Utilities/Tagging.py). Rows are streamed with fetchmany and grouped lazily,
+# so a caller that stops early never reads the rest of the catalog.
 
 def read_products():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM products')
-    products = [dict(row) for row in cur.fetchall()]
-    conn.close()
+    with readers.connection() as conn:
+        cur = conn.cursor()
+        cur.execute('SELECT * FROM products')
+        products = [dict(row) for row in cur.fetchall()]
     return products
 
+def read_products_by_id(ids, columns='*', chunk=500):
+    """``{id: row dict}`` for the given product ids (absent ids are left out)."""
+    out = {}
+    with readers.connection() as conn:
+        for start in range(0, len(ids), chunk):
+            batch = ids[start:start + chunk]
+            cur = conn.execute(f"SELECT {columns} FROM products WHERE id IN ({','.join('?' * len(batch))})",
+                               tuple(batch))
+            for row in cur.fetchall():
+                out[row['id']] = dict(row)
+    return out
+
 def infer_category(name):
-    name = name.lower()
-    categories = [
-        ("bra", ["bra"]),
-        ("legging", ["legging", "tights"]),
-        ("skirt", ["skirt"]),
-        ("bomber", ["bomber", "jacket"]),
-        ("hoodie", ["hoodie"]),
-        ("pullover", ["pullover", "sweatshirt"]),
-        ("shorts", ["shorts"]),
-        ("tee", ["tee", "t-shirt", "shirt"]),
-        ("vest", ["vest"]),
-        ("trouser", ["trouser", "pant", "pants"]),
-        ("swimsuit", ["swimsuit", "one-piece"]),
-        ("bikini", ["bikini"]),
-        ("dress", ["dress"]),
-        ("suit", ["suit"]),
-        ("jacket", ["jacket"]),
-        ("sweatpant", ["sweatpant"]),
-        ("coverup", ["coverup"]),
-        ("pajama", ["pajama"]),
-        ("top", ["top"]),
-        ("tank", ["tank"]),
-        ("crop", ["crop"]),
-        ("outerwear", ["outerwear"]),
-        ("activewear", ["activewear"]),
-        ("sleepwear", ["sleepwear"]),
-        ("lingerie", ["lingerie"]),
-        ("sweater", ["sweater"]),
-        ("coat", ["coat"]),
-        ("blazer", ["blazer"]),
-        ("jeans", ["jeans"]),
-        ("denim", ["denim"]),
-        ("romper", ["romper"]),
-        ("jumpsuit", ["jumpsuit"]),
-        ("cardigan", ["cardigan"]),
-        ("windbreaker", ["windbreaker"]),
-        ("puffer", ["puffer"]),
-    ]
-    for cat, keywords in categories:
-        for kw in keywords:
-            if kw in name:
-                return cat
-    return "other"
+    return Tagging.infer_category(name)
+
+def _stream(cur, batch_size):
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def list_categories(conn):
+    """Distinct inferred categories, read from the index alone."""
+    cur = conn.execute('SELECT DISTINCT inferred_category FROM products '
+                       'WHERE inferred_category IS NOT NULL ORDER BY inferred_category')
+    return [r[0] for r in cur.fetchall()]
+
+def iter_category(conn, category, clauses=(), params=(), columns='*', batch_size=256):
+    """Products of one inferred category in id order (an index range scan),
+    optionally narrowed by extra SQL ``clauses`` on alias ``p``."""
+    where = ''.join(' AND ' + c for c in clauses)
+    cur = conn.execute(f'SELECT {columns} FROM products p WHERE p.inferred_category = ?{where} ORDER BY p.id',
+                       (category,) + tuple(params))
+    return _stream(cur, batch_size)
+
+def iter_products(conn, clauses=(), params=(), columns='*', batch_size=256):
+    """Products in id order, optionally narrowed by SQL ``clauses`` on alias ``p``."""
+    where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    cur = conn.execute(f'SELECT {columns} FROM products p{where} ORDER BY p.id', tuple(params))
+    return _stream(cur, batch_size)
+
+def iter_products_by_category(conn=None, columns='*', batch_size=1000):
+    """Yield ``(category, rows)`` per inferred category, in category order and
+    rows in id order. ``rows`` is a lazy iterator that is only valid until the
+    next group is requested. ``columns`` must include inferred_category."""
+    if conn is None:
+        with readers.connection() as conn:
+            yield from iter_products_by_category(conn, columns, batch_size)
+        return
+    cur = conn.execute(f"SELECT {columns} FROM products WHERE inferred_category IS NOT NULL AND name <> '' "
+                       "ORDER BY inferred_category, id")
+    yield from groupby(_stream(cur, batch_size), key=lambda r: r['inferred_category'])
 
 def read_all_products_by_category():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute('SELECT * FROM products')
-    products = [dict(row) for row in cur.fetchall()]
-    conn.close()
-    category_dict = {}
-    for product in products:
-        name = product.get('name') or product.get('product_name')
-        if not name:
-            continue
-        category = infer_category(name)
-        if category not in category_dict:
-            category_dict[category] = []
-        category_dict[category].append(product)
-    return category_dict
+    return {category: [dict(r) for r in rows] for category, rows in iter_products_by_category()}
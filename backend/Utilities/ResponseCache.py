@@ -0,0 +1,105 @@
+import time
+import hashlib
+import threading
+from Models.embedding_cache import LRUCache
+from Utilities import Metrics
+
+# Version counters for data that cached responses are derived from. Triggers
+# bump 'catalog' on every products change (ingest, import, admin edits) and
+# 'scores' on every swipe, so all processes sharing app.db agree on when a
+# cached response went stale.
+VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS catalog_version (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO catalog_version(name, version) VALUES ('catalog', 0), ('scores', 0);
+CREATE TRIGGER IF NOT EXISTS trg_products_version_insert AFTER INSERT ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'catalog';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_version_update AFTER UPDATE ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'catalog';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_version_delete AFTER DELETE ON products BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'catalog';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_swipes_version_insert AFTER INSERT ON swipes BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'scores';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_swipes_version_delete AFTER DELETE ON swipes BEGIN
+    UPDATE catalog_version SET version = version + 1 WHERE name = 'scores';
+END;
+"""
+
+
+def init_versions(db):
+    db.executescript(VERSION_DDL)
+    db.commit()
+
+
+class VersionReader:
+    """Current catalog_version counters, re-read at most every ``check_interval`` seconds."""
+
+    def __init__(self, pool, check_interval=1.0):
+        self.pool = pool
+        self.check_interval = check_interval
+        self._versions = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked >= self.check_interval:
+            with self._lock:
+                if now - self._checked >= self.check_interval:
+                    with self.pool.connection() as conn:
+                        self._versions = dict(conn.execute('SELECT name, version FROM catalog_version').fetchall())
+                    self._checked = now
+        return self._versions
+
+    def invalidate(self):
+        """Force the next ``current()`` to re-read (e.g. right after an ingest)."""
+        self._checked = 0.0
+
+
+class ResponseCache:
+    """Bounded LRU of serialized responses with a TTL.
+
+    Entries are keyed by the caller (endpoint, normalized params, data
+    versions); a version bump therefore makes old entries unreachable and
+    they age out of the LRU. Each entry keeps the ETag of its body.
+    """
+
+    def __init__(self, maxsize=2048, ttl=60.0):
+        self.ttl = ttl
+        self._entries = LRUCache(maxsize)
+        self._stats_lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0}
+
+    def count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+        Metrics.CACHE_LOOKUPS.inc(cache='response', result=key)
+
+    def get(self, key):
+        """Return ``(body, mimetype, etag)`` or None if missing/expired."""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.count('misses')
+            return None
+        self.count('hits')
+        return entry[1:]
+
+    def put(self, key, body, mimetype):
+        etag = hashlib.sha1(body).hexdigest()
+        self._entries.put(key, (time.monotonic() + self.ttl, body, mimetype, etag))
+        return etag
+
+    def clear(self):
+        self._entries.clear()
+
+    def snapshot(self):
+        with self._stats_lock:
+            out = dict(self.stats)
+        out['entries'] = len(self._entries)
+        return out
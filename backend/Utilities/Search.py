@@ -0,0 +1,246 @@
+import re
+import sqlite3
+from Utilities.Pagination import InvalidCursor
+
+# Full-text index over the searchable product columns. The trigram tokenizer
+# gives substring/prefix matching from the index; triggers keep it in sync
+# with every insert/update/delete on products.
+SEARCH_COLUMNS = ('name', 'category', 'color', 'location')
+
+FTS_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    name, category, color, location, tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert AFTER INSERT ON products BEGIN
+    INSERT OR REPLACE INTO products_fts(rowid, name, category, color, location)
+    VALUES (NEW.id, NEW.name, NEW.category, NEW.color, NEW.location);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_fts_update AFTER UPDATE OF name, category, color, location ON products BEGIN
+    UPDATE products_fts SET name = NEW.name, category = NEW.category, color = NEW.color, location = NEW.location
+    WHERE rowid = NEW.id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete AFTER DELETE ON products BEGIN
+    DELETE FROM products_fts WHERE rowid = OLD.id;
+END;
+"""
+
+# bm25 column weights: a hit in the name matters most
+RANK_EXPR = 'bm25(products_fts, 10.0, 4.0, 2.0, 1.0)'
+# size of the typo-tolerant candidate pool (fixed so pages are stable)
+FUZZY_CANDIDATES = 200
+PRODUCT_COLUMNS = 'p.id, p.name, p.price, p.image, p.category, p.inferred_category, p.color, p.location, p.price_num'
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def init_search_index(db):
+    """Create the FTS table and triggers; populate it if it was just created.
+
+    Returns False when this SQLite build has no FTS5, in which case callers
+    fall back to LIKE scans.
+    """
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+    existed = cur.fetchone() is not None
+    # an UPSERT's DO UPDATE overrides "OR REPLACE" inside triggers, so replace
+    # the update trigger created by older versions
+    cur.execute("SELECT sql FROM sqlite_master WHERE name = 'trg_products_fts_update'")
+    row = cur.fetchone()
+    if row and 'OR REPLACE' in row[0]:
+        cur.execute('DROP TRIGGER trg_products_fts_update')
+    try:
+        db.executescript(FTS_DDL)
+    except sqlite3.OperationalError as e:
+        print('Warning: full-text search disabled -', e)
+        return False
+    if not existed:
+        rebuild_search_index(db)
+    return True
+
+
+def rebuild_search_index(db):
+    cur = db.cursor()
+    cur.execute('DELETE FROM products_fts')
+    cur.execute('''INSERT INTO products_fts(rowid, name, category, color, location)
+                   SELECT id, name, category, color, location FROM products''')
+    db.commit()
+
+
+def has_search_index(db):
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+    return cur.fetchone() is not None
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def build_filters(color=None, location=None, min_price=None, max_price=None):
+    clauses = []
+    params = []
+    if color:
+        clauses.append('p.color = ?')
+        params.append(color)
+    if location:
+        clauses.append('p.location = ?')
+        params.append(location)
+    if min_price is not None:
+        clauses.append('p.price_num >= ?')
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append('p.price_num <= ?')
+        params.append(max_price)
+    return clauses, params
+
+
+def _after(state, size):
+    """Validated keyset position from a decoded cursor, or None."""
+    after = (state or {}).get('after')
+    if after is None:
+        return None
+    if not isinstance(after, list) or len(after) != size or \
+            not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in after):
+        raise InvalidCursor('invalid cursor position')
+    return tuple(after)
+
+
+def _run(db, match, clauses, params, limit, after=None):
+    where = ['products_fts MATCH ?'] + clauses
+    args = [match] + list(params)
+    if after is not None:
+        # keyset on (rank, id); bm25 is deterministic for an unchanged index
+        where.append(f'({RANK_EXPR} > ? OR ({RANK_EXPR} = ? AND p.id > ?))')
+        args += [after[0], after[0], after[1]]
+    sql = f'''
+    SELECT {PRODUCT_COLUMNS}, {RANK_EXPR} AS rank
+    FROM products_fts
+    JOIN products p ON p.id = products_fts.rowid
+    WHERE {' AND '.join(where)}
+    ORDER BY rank, p.id
+    LIMIT ?
+    '''
+    cur = db.cursor()
+    cur.execute(sql, tuple(args) + (limit,))
+    return [dict(r) for r in cur.fetchall()]
+
+
+def _fuzzy_ranked(db, long_words, clauses, params):
+    """Typo-tolerant matches that the strict pass did not return, best first.
+
+    Candidates come from a fixed-size OR-of-trigrams query so the list is the
+    same on every page; each entry is ``((-overlap, rank, id), item)``.
+    """
+    grams = set()
+    for w in long_words:
+        grams |= _trigrams(w)
+    fuzzy = ' OR '.join(_quote(g) for g in sorted(grams))
+    ranked = []
+    for it in _run(db, fuzzy, clauses, params, FUZZY_CANDIDATES):
+        values = [str(it.get(c) or '').lower() for c in SEARCH_COLUMNS]
+        if all(any(w in v for v in values) for w in long_words):
+            continue  # a strict match, already paged through
+        text = ' '.join(values)
+        overlap = sum(1 for g in grams if g in text) / len(grams)
+        if overlap >= 0.5:
+            ranked.append(((-overlap, it['rank'], it['id']), it))
+    ranked.sort(key=lambda t: t[0])
+    return ranked
+
+
+def _id_page(db, where, params, limit, after):
+    clauses = list(where)
+    args = list(params)
+    if after is not None:
+        clauses.append('p.id > ?')
+        args.append(after[0])
+    sql_where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
+    cur = db.cursor()
+    cur.execute(f"SELECT {PRODUCT_COLUMNS} FROM products p {sql_where} ORDER BY p.id LIMIT ?",
+                tuple(args) + (limit + 1,))
+    rows = [dict(r) for r in cur.fetchall()]
+    if len(rows) > limit:
+        return rows[:limit], {'after': [rows[limit - 1]['id']]}
+    return rows, None
+
+
+def _strip_rank(items):
+    for it in items:
+        it.pop('rank', None)
+    return items
+
+
+def search_products(db, q, color=None, location=None, min_price=None, max_price=None, limit=50, cursor=None):
+    """Ranked product search composed with the color/location/price filters.
+
+    Every word of three or more characters must appear (as a substring) in
+    some searchable column; results are ordered by bm25. Once those run out,
+    a typo-tolerant pass continues with rows sharing at least half of the
+    query's trigrams. Queries too short for trigrams fall back to a prefix
+    match on the name.
+
+    Returns ``(items, next_state)``; ``cursor`` is a previous ``next_state``
+    and ``next_state`` is None on the last page.
+    """
+    clauses, params = build_filters(color, location, min_price, max_price)
+    words = [w.lower() for w in _WORD_RE.findall(q or '')]
+    long_words = [w for w in words if len(w) >= 3]
+
+    if not long_words:
+        # one/two-character input: prefix match on name
+        return _id_page(db, ['p.name LIKE ?'] + clauses, [f"{(q or '').strip()}%"] + params,
+                        limit, _after(cursor, 1))
+
+    phase = (cursor or {}).get('phase', 'strict')
+    if phase == 'strict':
+        strict = ' AND '.join(_quote(w) for w in long_words)
+        items = _run(db, strict, clauses, params, limit + 1, _after(cursor, 2))
+        if len(items) > limit:
+            items = items[:limit]
+            next_state = {'phase': 'strict', 'after': [items[-1]['rank'], items[-1]['id']]}
+            return _strip_rank(items), next_state
+        fuzzy_after = None
+    elif phase == 'fuzzy':
+        items = []
+        fuzzy_after = _after(cursor, 3)
+    else:
+        raise InvalidCursor('invalid cursor phase')
+
+    ranked = _fuzzy_ranked(db, long_words, clauses, params)
+    if fuzzy_after is not None:
+        ranked = [r for r in ranked if r[0] > fuzzy_after]
+    need = limit - len(items)
+    page = ranked[:need]
+    items.extend(it for _, it in page)
+    next_state = None
+    if len(ranked) > need:
+        next_state = {'phase': 'fuzzy', 'after': list(page[-1][0]) if page else None}
+    return _strip_rank(items), next_state
+
+
+def snapshot_search(snapshot, color=None, location=None, min_price=None, max_price=None, limit=50, cursor=None):
+    """Filter-only search answered from the in-memory catalog snapshot.
+
+    Same id-ordered pages and cursors as ``like_search``.
+    """
+    after = _after(cursor, 1)
+    mask = snapshot.mask(color=color, location=location, min_price=min_price, max_price=max_price)
+    items, more = snapshot.id_page(mask, after_id=after[0] if after else None, limit=limit)
+    return items, ({'after': [items[-1]['id']]} if more else None)
+
+
+def like_search(db, q, color=None, location=None, min_price=None, max_price=None, limit=50, cursor=None):
+    """LIKE scan, used for filter-only requests and when FTS5 is unavailable.
+
+    Pages by product id; returns ``(items, next_state)`` like ``search_products``.
+    """
+    clauses, params = build_filters(color, location, min_price, max_price)
+    if q:
+        clauses.insert(0, "(p.name LIKE ? OR p.category LIKE ? OR p.color LIKE ? OR p.location LIKE ?)")
+        like_q = f"%{q}%"
+        params = [like_q] * 4 + params
+    return _id_page(db, clauses, params, limit, _after(cursor, 1))
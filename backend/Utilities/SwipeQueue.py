@@ -0,0 +1,109 @@
+import queue
+import atexit
+import sqlite3
+import threading
+from Utilities.Database import configure
+from Utilities.Metrics import connection_factory
+
+
+class SwipeWriter:
+    """Write-behind ingestion for swipe events.
+
+    Request handlers call ``submit`` and return immediately; a single writer
+    thread drains the queue and inserts whole batches into ``swipes`` in one
+    transaction (WAL mode, so readers are not blocked). The same batch is
+    recorded in the user feedback store, and ``on_batch`` (if set) is called
+    with the committed events so follow-up work happens off the request path.
+    """
+
+    def __init__(self, db_path, batch_size=256, flush_interval=0.2, maxsize=10000, on_batch=None):
+        self.db_path = str(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_batch = on_batch
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._idle = threading.Condition()
+        self._inflight = 0
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='swipe-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.drain)
+
+    def submit(self, event):
+        """Queue one swipe ({item_id, action, user_id, item_image}). Returns False if the queue is full."""
+        self.start()
+        with self._idle:
+            self._inflight += 1
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            with self._idle:
+                self._inflight -= 1
+            self.dropped += 1
+            return False
+
+    def drain(self, timeout=5.0):
+        """Block until everything submitted so far has been committed."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._inflight == 0, timeout=timeout)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, factory=connection_factory())
+        conn.row_factory = sqlite3.Row
+        return configure(conn)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write(conn, batch)
+                self.written += len(batch)
+                if self.on_batch is not None:
+                    self.on_batch(batch)
+            except Exception as e:
+                print('swipe writer error', e)
+            finally:
+                with self._idle:
+                    self._inflight -= len(batch)
+                    self._idle.notify_all()
+
+    def _write(self, conn, batch):
+        with conn:
+            conn.executemany(
+                'INSERT INTO swipes(item_id, action, user_id, item_image) VALUES (?,?,?,?)',
+                [(e['item_id'], e['action'], e.get('user_id'), e.get('item_image')) for e in batch])
+        # user feedback needs product attributes; fetch them for the whole batch at once
+        with_users = [e for e in batch if e.get('user_id')]
+        if not with_users:
+            return
+        from Models.user_feedback import add_liked_product, add_disliked_product
+        ids = sorted(set(e['item_id'] for e in with_users))
+        placeholders = ','.join('?' * len(ids))
+        products = {r['id']: dict(r) for r in conn.execute(
+            f'SELECT id, name, category, color AS current_color FROM products WHERE id IN ({placeholders})', ids)}
+        for e in with_users:
+            product = products.get(e['item_id'])
+            if product is None:
+                continue
+            if e['action'] == 'like':
+                add_liked_product(e['user_id'], product)
+            else:
+                add_disliked_product(e['user_id'], product)
@@ -0,0 +1,191 @@
+import re
+
+# Keyword tagging of products (inferred category and gender). Every keyword
+# table is compiled into one trie-shaped regex that reports, for each position
+# of the text, the longest keyword starting there; keywords that are prefixes of it
+# match at the same position, so each hit is expanded to the best rule of
+# every table up front. One scan of a name therefore gives the same answer as
+# running each table's ordered substring cascade separately. Tags are
+# persisted in products.inferred_category / products.gender: computed at
+# ingest for new and changed rows, and in bulk by tag_products().
+
+# (label, keywords); substring matches on the lowercased text, earlier rules win
+CATEGORY_RULES = [
+    ("bra", ["bra"]),
+    ("legging", ["legging", "tights"]),
+    ("skirt", ["skirt"]),
+    ("bomber", ["bomber", "jacket"]),
+    ("hoodie", ["hoodie"]),
+    ("pullover", ["pullover", "sweatshirt"]),
+    ("shorts", ["shorts"]),
+    ("tee", ["tee", "t-shirt", "shirt"]),
+    ("vest", ["vest"]),
+    ("trouser", ["trouser", "pant", "pants"]),
+    ("swimsuit", ["swimsuit", "one-piece"]),
+    ("bikini", ["bikini"]),
+    ("dress", ["dress"]),
+    ("suit", ["suit"]),
+    ("jacket", ["jacket"]),
+    ("sweatpant", ["sweatpant"]),
+    ("coverup", ["coverup"]),
+    ("pajama", ["pajama"]),
+    ("top", ["top"]),
+    ("tank", ["tank"]),
+    ("crop", ["crop"]),
+    ("outerwear", ["outerwear"]),
+    ("activewear", ["activewear"]),
+    ("sleepwear", ["sleepwear"]),
+    ("lingerie", ["lingerie"]),
+    ("sweater", ["sweater"]),
+    ("coat", ["coat"]),
+    ("blazer", ["blazer"]),
+    ("jeans", ["jeans"]),
+    ("denim", ["denim"]),
+    ("romper", ["romper"]),
+    ("jumpsuit", ["jumpsuit"]),
+    ("cardigan", ["cardigan"]),
+    ("windbreaker", ["windbreaker"]),
+    ("puffer", ["puffer"]),
+]
+DEFAULT_CATEGORY = "other"
+
+GENDER_RULES = [
+    ('male', ['men', 'man', 'male', 'boy', 'guys', 'gentlemen', 'mens', 'boys']),
+    ('female', ['women', 'woman', 'female', 'girl', 'ladies', 'womens', 'girls', 'lady']),
+]
+DEFAULT_GENDER = 'unknown'
+
+
+def _trie_pattern(words):
+    """Regex for ``words`` with shared prefixes factored out (longest match wins)."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ''
+        body = alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+        return f'(?:{body})?' if '' in node else body
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Several ordered keyword tables behind a single compiled regex.
+
+    ``ranks(text)`` returns, per table, the index of the first rule with a
+    keyword occurring in ``text`` (or None).
+    """
+
+    def __init__(self, tables):
+        self.tables = list(tables)
+        first = {}
+        for t, rules in enumerate(tables.values()):
+            for rank, (_, keywords) in enumerate(rules):
+                for kw in keywords:
+                    first.setdefault(kw, {}).setdefault(t, rank)
+        keywords = sorted(first)
+        # keyword -> best rank per table over every keyword that is a prefix of it
+        self._hits = {}
+        for kw in keywords:
+            best = [None] * len(self.tables)
+            for other, ranks in first.items():
+                if kw.startswith(other):
+                    for t, rank in ranks.items():
+                        if best[t] is None or rank < best[t]:
+                            best[t] = rank
+            self._hits[kw] = tuple(best)
+        # a lookahead so overlapping keywords are all seen ("women" and "men")
+        self._regex = re.compile('(?=(' + _trie_pattern(keywords) + '))')
+
+    def ranks(self, text):
+        best = [None] * len(self.tables)
+        if not text:
+            return best
+        for kw in set(self._regex.findall(text.lower())):
+            for t, rank in enumerate(self._hits[kw]):
+                if rank is not None and (best[t] is None or rank < best[t]):
+                    best[t] = rank
+        return best
+
+
+_matcher = KeywordMatcher({'category': CATEGORY_RULES, 'gender': GENDER_RULES})
+
+
+def _label(rules, rank, default):
+    return default if rank is None else rules[rank][0]
+
+
+def infer_category(name):
+    return _label(CATEGORY_RULES, _matcher.ranks(name)[0], DEFAULT_CATEGORY)
+
+
+def infer_gender(text):
+    return _label(GENDER_RULES, _matcher.ranks(text)[1], DEFAULT_GENDER)
+
+
+def tag(name, category=None):
+    """``(inferred_category, gender)`` for a product.
+
+    The category comes from the name alone; gender looks at the name and the
+    source category (e.g. "Mens" sections of a retailer feed).
+    """
+    category_rank, gender_rank = _matcher.ranks(name)
+    if category:
+        other = _matcher.ranks(category)[1]
+        if other is not None and (gender_rank is None or other < gender_rank):
+            gender_rank = other
+    return (_label(CATEGORY_RULES, category_rank, DEFAULT_CATEGORY),
+            _label(GENDER_RULES, gender_rank, DEFAULT_GENDER))
+
+
+UPDATE_SQL = '''
+UPDATE products SET inferred_category = ?, gender = ?
+WHERE id = ? AND (inferred_category IS NOT ? OR gender IS NOT ?)
+'''
+
+
+def init_tagging(db):
+    """Add the indexed inferred_category column (gender already exists) and
+    tag any rows written before it existed or by paths that bypass the ingest."""
+    cols = [r[1] for r in db.execute('PRAGMA table_info(products)')]
+    if 'inferred_category' not in cols:
+        db.execute('ALTER TABLE products ADD COLUMN inferred_category TEXT')
+    # also covers (inferred_category, id): id is the rowid
+    db.execute('CREATE INDEX IF NOT EXISTS idx_products_inferred_category ON products(inferred_category)')
+    db.commit()
+    return tag_products(db)
+
+
+def tag_products(db, force=False, batch_size=5000):
+    """Tag untagged products (every product with ``force``) in one transaction.
+
+    Rows whose tags are already correct are not rewritten. Returns
+    ``{'scanned': n, 'updated': n}``.
+    """
+    where = '' if force else 'AND inferred_category IS NULL'
+    stats = {'scanned': 0, 'updated': 0}
+    last_id = None
+    try:
+        # keyset batches, each fully read before it is written
+        while True:
+            rows = db.execute(f'SELECT id, name, category FROM products WHERE id > ? {where} ORDER BY id LIMIT ?',
+                              (-1 if last_id is None else last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            updates = []
+            for pid, name, category in rows:
+                inferred, gender = tag(name, category)
+                updates.append((inferred, gender, pid, inferred, gender))
+            stats['scanned'] += len(rows)
+            stats['updated'] += db.executemany(UPDATE_SQL, updates).rowcount
+            last_id = rows[-1][0]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return stats
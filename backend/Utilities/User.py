@@ -1,5 +1,4 @@
-import json
-import os
+from Models.feedback_store import get_store
 
 
 class User:
@@ -12,29 +11,7 @@ class User:
         return f"User_id: {self.user_id}, Username: {self.username}, Email: {self.email}"
 
     def update_likes(self, product_id, product_description):
-        # Ensure the preference file exists
-        if not os.path.exists('user_preference.json'):
-            with open('user_preference.json', 'w') as f:
-                json.dump({}, f)
-        with open('user_preference.json', 'r') as f:
-            users = json.load(f)
-        if self.user_id not in users:
-            users[self.user_id] = {"liked_products": [product_description], "disliked_products": []}
-        else:
-            users[self.user_id]["liked_products"].append(product_description)
-        with open('user_preference.json', 'w') as f:
-            json.dump(users, f)
+        get_store().record(self.user_id, 'liked', product_description)
 
     def update_dislikes(self, product_id, product_description):
-        # Ensure the preference file exists
-        if not os.path.exists('user_preference.json'):
-            with open('user_preference.json', 'w') as f:
-                json.dump({}, f)
-        with open('user_preference.json', 'r') as f:
-            users = json.load(f)
-        if self.user_id not in users:
-            users[self.user_id] = {"liked_products": [], "disliked_products": [product_description]}
-        else:
-            users[self.user_id]["disliked_products"].append(product_description)
-        with open('user_preference.json', 'w') as f:
-            json.dump(users, f)
\ No newline at end of file
+        get_store().record(self.user_id, 'disliked', product_description)
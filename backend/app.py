@@ -1,45 +1,76 @@
-from flask import Flask, jsonify, request, g
+from flask import Flask, jsonify, request, g, Response
 from flask_cors import CORS
 import sqlite3
 import os
 import random
 from pathlib import Path
 from uuid import uuid4
-from Models.image_based_recommendation import recommend_from_image
-# image_based_recommender uses numpy, keras, etc. Make import optional so the
-# server can start even if those heavy dependencies aren't installed in dev.
-try:
+from Models.model_registry import LazyModel
+from Models.embedding_cache import LRUCache
+from Utilities.SwipeQueue import SwipeWriter
+from Utilities import Search
+from Utilities import Database
+from Utilities import ResponseCache
+from Utilities import CatalogSnapshot
+from Utilities import Metrics
+from functools import wraps
+from Utilities import Ingest
+from Utilities import CatalogImport
+from Utilities import Tagging
+from Utilities import Products
+import click
+from Utilities.Pagination import encode_cursor, decode_cursor, page_size, InvalidCursor
+import time
+import heapq
+from itertools import islice, zip_longest
+import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+
+
+# Heavy models (TensorFlow/VGG16 and sentence-transformers) are loaded lazily
+# so the server binds immediately and can run without those dependencies.
+# Until a model is ready, endpoints fall back to their SQL-only paths.
+def _load_image_recommender():
     from Models import image_based_recommendation
-except Exception as e:
-    image_based_recommendation = None
-    print('Warning: image_based_recommendation disabled -', e)
+    image_based_recommendation.get_model()
+    image_based_recommendation.get_feature_index()
+    return image_based_recommendation
 
-# NLP recommender (optional) - similar opt-in import
-try:
+
+def _load_nlp_recommender():
     from Models.nlp_recommender import NLPRecommender
-    try:
-        _nlp = NLPRecommender()
-    except Exception as _e:
-        print('Warning: failed to instantiate NLPRecommender -', _e)
-        _nlp = None
-except Exception as e:
-    _nlp = None
-    # keep going if sentence-transformers not installed
-    print('Warning: NLP recommender disabled -', e)
+    return NLPRecommender()
 
-import threading
+
+image_model = LazyModel('image', _load_image_recommender)
+nlp_model = LazyModel('nlp', _load_nlp_recommender)
+
+# warm up in the background of every process (each gunicorn worker) unless
+# disabled; otherwise models load on first use
+if os.getenv('WARMUP_MODELS', '1') in ('1', 'true', 'True'):
+    image_model.start_background()
+    nlp_model.start_background()
 
 app = Flask(__name__)
 CORS(app)
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / 'app.db'
+DB_PATH = Path(Database.DB_PATH)
 
 def get_db():
+    """Pooled read-write connection for this request (returned on teardown)."""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(str(DB_PATH))
-        db.row_factory = sqlite3.Row
+        db = g._database = Database.writers.acquire()
+    return db
+
+
+def get_read_db():
+    """Pooled read-only connection; in WAL mode it never waits on writers."""
+    db = getattr(g, '_read_database', None)
+    if db is None:
+        db = g._read_database = Database.readers.acquire()
     return db
 
 def init_db():
@@ -117,129 +148,25 @@ def init_db():
         except Exception:
             pass
     db.commit()
-    # try to load dataset file and upsert into products
+    # full-text index kept in sync with products by triggers
+    Search.init_search_index(db)
+    # inferred_category/gender columns; tags rows that predate them
+    Tagging.init_tagging(db)
+    # dedup indexes, file/row hash bookkeeping and the products -> items triggers
+    Ingest.init_ingest(db)
+    # version counters behind the response cache
+    ResponseCache.init_versions(db)
+    # upsert data/products.json; unchanged files are skipped by content hash
+    # and unchanged rows by row hash. Retailer CSVs in backend/Datasets are
+    # imported offline with `flask --app app import-catalog`.
     data_file = BASE_DIR / 'data' / 'products.json'
     if data_file.exists():
-        import json
-        with open(data_file, 'r') as f:
-            items = json.load(f)
-        for p in items:
-            # upsert using SQLite INSERT OR REPLACE
-            # parse numeric price if available
-            def parse_price_num(val):
-                try:
-                    if val is None:
-                        return None
-                    s = str(val).strip()
-                    # remove common currency symbols and commas
-                    s = s.replace('$','').replace('₹','').replace('£','').replace(',','')
-                    # keep digits and dot
-                    import re
-                    m = re.findall(r"[0-9]+(?:\.[0-9]+)?", s)
-                    if not m:
-                        return None
-                    return float(m[0])
-                except Exception:
-                    return None
-
-            price_num = parse_price_num(p.get('price'))
-            cur.execute('INSERT OR REPLACE INTO products(id,name,price,image,category,color,location,price_num) VALUES (?,?,?,?,?,?,?,?)',
-                        (p.get('id'), p.get('name'), p.get('price'), p.get('image'), p.get('category'), p.get('color'), p.get('location'), price_num))
-        db.commit()
-        # import CSVs from backend/Datasets if present
-        datasets_dir = BASE_DIR / 'Datasets'
-        if datasets_dir.exists() and datasets_dir.is_dir():
-            import csv
-            # bookkeeping table to avoid re-importing the same file repeatedly
-            cur.execute('CREATE TABLE IF NOT EXISTS imported_files (filename TEXT PRIMARY KEY, mtime REAL)')
-            db.commit()
-            # determine current max id to generate ids when missing
-            cur.execute('SELECT IFNULL(MAX(id), 0) as m FROM products')
-            max_id = cur.fetchone()['m'] or 0
-            next_id = max_id + 1
-            for csvf in sorted(datasets_dir.glob('*.csv')):
-                try:
-                    mtime = csvf.stat().st_mtime
-                except Exception:
-                    mtime = None
-                # skip file if it was already imported with same mtime
-                skip_file = False
-                if mtime is not None:
-                    cur.execute('SELECT mtime FROM imported_files WHERE filename = ?', (csvf.name,))
-                    row_m = cur.fetchone()
-                    if row_m and row_m['mtime'] == mtime:
-                        skip_file = True
-                if skip_file:
-                    continue
-
-                with open(csvf, newline='') as fh:
-                    reader = csv.DictReader(fh)
-                    for row in reader:
-                        # normalized fields
-                        pid = row.get('id') or row.get('product_id') or ''
-                        try:
-                            pid = int(pid) if str(pid).strip()!='' else None
-                        except Exception:
-                            pid = None
-                        name = row.get('name') or row.get('title') or ''
-                        price = row.get('price') or row.get('cost') or ''
-                        image = (row.get('image') or row.get('image_url') or '').strip()
-                        category = row.get('category') or ''
-                        color = row.get('color') or ''
-                        location = row.get('location') or ''
-
-                        # parse numeric price
-                        def parse_price_num_local(val):
-                            try:
-                                if val is None:
-                                    return None
-                                s = str(val).strip()
-                                s = s.replace('$','').replace('₹','').replace('£','').replace(',','')
-                                import re
-                                m = re.findall(r"[0-9]+(?:\.[0-9]+)?", s)
-                                if not m:
-                                    return None
-                                return float(m[0])
-                            except Exception:
-                                return None
-
-                        price_num = parse_price_num_local(price)
-
-                        # if pid not provided, try to find an existing product by image or exact name+price
-                        if pid is None:
-                            pid = None
-                            if image:
-                                cur.execute('SELECT id FROM products WHERE image = ? LIMIT 1', (image,))
-                                prow = cur.fetchone()
-                                if prow:
-                                    pid = prow['id']
-                            if pid is None and name:
-                                cur.execute('SELECT id FROM products WHERE name = ? AND price = ? LIMIT 1', (name, price))
-                                prow = cur.fetchone()
-                                if prow:
-                                    pid = prow['id']
-                            if pid is None:
-                                pid = next_id
-                                next_id += 1
-
-                        cur.execute('INSERT OR REPLACE INTO products(id,name,price,image,category,color,location,price_num) VALUES (?,?,?,?,?,?,?,?)',
-                                    (pid, name or f'Product {pid}', price, image, category, color, location, price_num))
-
-                # record the import so we won't reprocess unchanged files
-                try:
-                    cur.execute('INSERT OR REPLACE INTO imported_files(filename, mtime) VALUES (?,?)', (csvf.name, mtime))
-                    db.commit()
-                except Exception:
-                    db.commit()
-    
-    # sync products into items table for backward compatibility
-    cur.execute('SELECT id,name,price,image FROM products')
-    prod_rows = cur.fetchall()
-    if prod_rows:
-        # clear items and repopulate from products
-        cur.execute('DELETE FROM items')
-        cur.executemany('INSERT INTO items(id,name,price,image) VALUES (?,?,?,?)', [(r['id'], r['name'], r['price'], r['image']) for r in prod_rows])
-        db.commit()
+        stats = Ingest.ingest_sources(db, [(data_file, Ingest.json_rows, False)])
+        if stats['rows_written']:
+            print(f"Catalog ingest: {stats['rows_written']} product row(s) written from {data_file.name}")
+    cur.execute('SELECT 1 FROM products LIMIT 1')
+    if cur.fetchone() is None and (BASE_DIR / 'Datasets').is_dir():
+        print('Catalog is empty - load the retailer CSVs with `flask --app app import-catalog`')
     # Migrate swipes table if missing new columns (user_id, item_image)
     cur.execute("PRAGMA table_info(swipes)")
     cols = [r['name'] for r in cur.fetchall()]
@@ -248,150 +175,316 @@ def init_db():
     if 'item_image' not in cols:
         cur.execute("ALTER TABLE swipes ADD COLUMN item_image TEXT")
     db.commit()
+    # indexes backing the personalized candidate query in fetch_recommendations
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_swipes_user_item ON swipes(user_id, item_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_swipes_item ON swipes(item_id)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_products_category ON products(category)')
+    cur.execute('CREATE INDEX IF NOT EXISTS idx_products_price_num ON products(price_num)')
+    db.commit()
+    init_product_scores(db)
+
+
+# Materialized popularity (likes - dislikes) per product, kept current by
+# triggers on swipes/products so the anonymous feed is an index range read
+# instead of a GROUP BY over the whole swipe history.
+# product_scores.shuffle is drawn from [0, SHUFFLE_RANGE)
+SHUFFLE_RANGE = 1000000
+PRODUCT_SCORES_DDL = """
+CREATE TABLE IF NOT EXISTS product_scores (
+    product_id INTEGER PRIMARY KEY,
+    likes INTEGER NOT NULL DEFAULT 0,
+    dislikes INTEGER NOT NULL DEFAULT 0,
+    score INTEGER NOT NULL DEFAULT 0,
+    shuffle INTEGER NOT NULL DEFAULT (abs(random()) % 1000000)
+);
+CREATE INDEX IF NOT EXISTS idx_product_scores_rank ON product_scores(score DESC, shuffle);
+CREATE TRIGGER IF NOT EXISTS trg_swipes_score_insert AFTER INSERT ON swipes BEGIN
+    INSERT INTO product_scores(product_id, likes, dislikes, score)
+    VALUES (NEW.item_id, NEW.action = 'like', NEW.action = 'dislike', CASE NEW.action WHEN 'like' THEN 1 ELSE -1 END)
+    ON CONFLICT(product_id) DO UPDATE SET
+        likes = likes + excluded.likes,
+        dislikes = dislikes + excluded.dislikes,
+        score = score + excluded.score;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_swipes_score_delete AFTER DELETE ON swipes BEGIN
+    UPDATE product_scores SET
+        likes = likes - (OLD.action = 'like'),
+        dislikes = dislikes - (OLD.action = 'dislike'),
+        score = score - CASE OLD.action WHEN 'like' THEN 1 ELSE -1 END
+    WHERE product_id = OLD.item_id;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_score_insert AFTER INSERT ON products BEGIN
+    INSERT OR IGNORE INTO product_scores(product_id) VALUES (NEW.id);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_products_score_delete AFTER DELETE ON products BEGIN
+    DELETE FROM product_scores WHERE product_id = OLD.id;
+END;
+"""
+
+
+def init_product_scores(db):
+    """Create product_scores and its triggers; rebuild it if it was just created."""
+    cur = db.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_scores'")
+    existed = cur.fetchone() is not None
+    db.executescript(PRODUCT_SCORES_DDL)
+    if not existed:
+        rebuild_product_scores(db)
+
+
+def rebuild_product_scores(db):
+    """Recompute product_scores from the full swipes table (and reshuffle tie order)."""
+    cur = db.cursor()
+    cur.execute('DELETE FROM product_scores')
+    cur.execute("""
+        INSERT INTO product_scores(product_id, likes, dislikes, score)
+        SELECT p.id,
+            IFNULL(SUM(s.action = 'like'), 0),
+            IFNULL(SUM(s.action = 'dislike'), 0),
+            IFNULL(SUM(CASE WHEN s.action='like' THEN 1 WHEN s.action='dislike' THEN -1 ELSE 0 END), 0)
+        FROM products p
+        LEFT JOIN swipes s ON s.item_id = p.id
+        GROUP BY p.id
+    """)
+    db.commit()
+    cur.execute('SELECT COUNT(1) AS c FROM product_scores')
+    return cur.fetchone()[0]
 
 @app.teardown_appcontext
 def close_connection(exception):
-    db = getattr(g, '_database', None)
+    db = g.pop('_database', None)
+    if db is not None:
+        Database.writers.release(db)
+    db = g.pop('_read_database', None)
     if db is not None:
-        db.close()
+        Database.readers.release(db)
+
+# Per-route latency histograms (exported by /metrics) and the sampled cProfile
+# capture armed through /admin/profile
+profiler = Metrics.SampledProfiler(os.getenv('PROFILE_DIR') or str(BASE_DIR / 'profiles'))
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+@app.before_request
+def _start_request():
+    g._request_started = time.perf_counter()
+    g._profile = profiler.maybe_begin()
+
+
+@app.after_request
+def _record_request(response):
+    started = g.get('_request_started')
+    if started is not None:
+        route = _route_label()
+        Metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method)
+        Metrics.REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def _finish_profile(exception):
+    profile = g.pop('_profile', None)
+    if profile is not None:
+        try:
+            profiler.finish(profile, _route_label())
+        except OSError as e:
+            print('profile dump error', e)
+
+# Catalog-derived responses are cached per endpoint + normalized query +
+# the catalog_version counters they depend on, and served with ETags so
+# clients (the Next.js API routes) can revalidate with If-None-Match.
+response_cache = ResponseCache.ResponseCache(maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', '2048')),
+                                             ttl=float(os.getenv('RESPONSE_CACHE_TTL', '60')))
+catalog_versions = ResponseCache.VersionReader(Database.readers)
+
+
+# columnar in-memory copy of products, rebuilt when the catalog version moves
+catalog = CatalogSnapshot.SnapshotHolder(Database.readers, catalog_versions)
+# filtered anonymous feeds with at most this many matching products are ranked
+# with one IN query; larger ones walk the score index and test the mask
+ANON_CANDIDATE_LIMIT = 500
+RECOMMENDATION_COLUMNS = ('p.id, p.name, p.price, p.image, p.category, p.inferred_category, p.color, p.location, '
+                          'p.price_num')
+
+
+def cached_response(*versions, extra=None, skip=None):
+    """Serve the view from ``response_cache``; ``skip()`` true bypasses it.
+
+    Only 200 responses are stored, and not those the view marks
+    ``Cache-Control: no-store`` (e.g. degraded results). A fresh response
+    keeps its ``Server-Timing`` header; the cached body never holds timings.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if skip is not None and skip():
+                return view(*args, **kwargs)
+            current = catalog_versions.current()
+            params = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v != ''))
+            key = (request.path, params, tuple(current.get(v) for v in versions), extra() if extra else None)
+            hit = response_cache.get(key)
+            if hit is None:
+                fresh = app.make_response(view(*args, **kwargs))
+                if fresh.status_code != 200 or 'no-store' in (fresh.headers.get('Cache-Control') or ''):
+                    return fresh
+                body, mimetype = fresh.get_data(), fresh.mimetype
+                etag = response_cache.put(key, body, mimetype)
+            else:
+                fresh = None
+                body, mimetype, etag = hit
+            resp = app.response_class(body, mimetype=mimetype)
+            if fresh is not None and 'Server-Timing' in fresh.headers:
+                resp.headers['Server-Timing'] = fresh.headers['Server-Timing']
+            resp.set_etag(etag)
+            resp.headers['Cache-Control'] = 'no-cache'
+            resp.make_conditional(request)
+            if resp.status_code == 304:
+                response_cache.count('not_modified')
+            return resp
+        return wrapper
+    return decorator
+
+
+def _rotated_scores(db, offset, batch_size=1000):
+    """Yield ``(product_id, score)`` by score descending; each equal-score run
+    is read from ``shuffle >= offset`` and then wraps to ``shuffle < offset``.
+    Every step is a range read on idx_product_scores_rank."""
+    score = db.execute('SELECT MAX(score) FROM product_scores').fetchone()[0]
+    while score is not None:
+        for clause in ('shuffle >= ?', 'shuffle < ?'):
+            cur = db.execute(f'SELECT product_id, score FROM product_scores WHERE score = ? AND {clause} '
+                             'ORDER BY shuffle', (score, offset))
+            yield from Products._stream(cur, batch_size)
+        score = db.execute('SELECT MAX(score) FROM product_scores WHERE score < ?', (score,)).fetchone()[0]
+
 
 def fetch_recommendations(limit=10, user_id=None, category=None, color=None, location=None, min_price=None, max_price=None):
-    db = get_db()
+    db = get_read_db()
     cur = db.cursor()
-    # Helper: get set of swiped product ids for user
-    def get_swiped_ids(user_id):
-        cur.execute('SELECT DISTINCT item_id FROM swipes WHERE user_id = ?', (user_id,))
-        return set([row['item_id'] for row in cur.fetchall()])
-
-    # Helper: get liked categories for user, sorted by like count desc
-    def get_liked_categories(user_id):
-        cur.execute('''
-            SELECT p.category, COUNT(*) as cnt
-            FROM swipes s JOIN products p ON s.item_id = p.id
-            WHERE s.user_id = ? AND s.action = 'like' AND p.category IS NOT NULL AND p.category != ''
-            GROUP BY p.category
-            ORDER BY cnt DESC
-        ''', (user_id,))
-        return [row['category'] for row in cur.fetchall()]
-
-    # Build filters
-    def build_filters(category, color, location, min_price, max_price):
-        clauses = []
-        params = []
-        if category:
-            clauses.append('p.category = ?')
-            params.append(category)
-        if color:
-            clauses.append('p.color = ?')
-            params.append(color)
-        if location:
-            clauses.append('p.location = ?')
-            params.append(location)
-        if min_price is not None:
-            clauses.append('p.price_num >= ?')
-            params.append(min_price)
-        if max_price is not None:
-            clauses.append('p.price_num <= ?')
-            params.append(max_price)
-        if clauses:
-            return 'WHERE ' + ' AND '.join(clauses), tuple(params)
-        return '', ()
-
-    # If no user, fallback to global logic
+    # If no user, fallback to global logic: rank by product_scores, highest
+    # score first. Equal scores are read in (score, shuffle) index order from
+    # a random shuffle offset per request, wrapping around, so every request
+    # starts somewhere else in a tied run. Filters are evaluated as a mask
+    # over the catalog snapshot and only the returned page is materialized.
     if not user_id:
-        filter_where, filter_params = build_filters(category, color, location, min_price, max_price)
-        sql = f'''
-        SELECT p.id, p.name, p.price, p.image, p.category, p.color, p.location, p.price_num,
-            IFNULL(SUM(CASE WHEN s.action='like' THEN 1 WHEN s.action='dislike' THEN -1 ELSE 0 END), 0) as score
-        FROM products p
-        LEFT JOIN swipes s ON s.item_id = p.id
-        {filter_where}
-        GROUP BY p.id
-        ORDER BY score DESC, RANDOM()
-        LIMIT ?
-        '''
-        params = tuple(filter_params) + (limit,)
-        cur.execute(sql, params)
-        rows = cur.fetchall()
-        items = [dict(r) for r in rows]
-        return items
-
-    # Personalized logic
-    swiped_ids = get_swiped_ids(user_id)
-    liked_cats = get_liked_categories(user_id)
-    result = []
-    used_ids = set()
-
-    # 1. Recommend from liked categories, not yet swiped
-    for cat in liked_cats:
-        filter_where, filter_params = build_filters(cat, color, location, min_price, max_price)
-        sql = f"""
-        SELECT p.id, p.name, p.price, p.image, p.category, p.color, p.location, p.price_num
-        FROM products p
-        {filter_where}
-        """
-        cur.execute(sql, filter_params)
-        for row in cur.fetchall():
-            if row['id'] not in swiped_ids and row['id'] not in used_ids:
-                result.append(dict(row))
-                used_ids.add(row['id'])
-            if len(result) >= limit:
-                return result[:limit]
-
-    # 2. If not enough, recommend from other categories, not yet swiped
-    filter_where, filter_params = build_filters(None, color, location, min_price, max_price)
-    sql = f"""
-    SELECT p.id, p.name, p.price, p.image, p.category, p.color, p.location, p.price_num
-    FROM products p
-    {filter_where}
-    """
-    cur.execute(sql, filter_params)
-    for row in cur.fetchall():
-        if row['id'] not in swiped_ids and row['id'] not in used_ids:
-            result.append(dict(row))
-            used_ids.add(row['id'])
-        if len(result) >= limit:
-            return result[:limit]
-
-    # 3. If still not enough, recommend from liked categories (even if swiped)
-    for cat in liked_cats:
-        filter_where, filter_params = build_filters(cat, color, location, min_price, max_price)
-        sql = f"""
-        SELECT p.id, p.name, p.price, p.image, p.category, p.color, p.location, p.price_num
-        FROM products p
-        {filter_where}
-        """
-        cur.execute(sql, filter_params)
-        for row in cur.fetchall():
-            if row['id'] not in used_ids:
-                result.append(dict(row))
-                used_ids.add(row['id'])
-            if len(result) >= limit:
-                return result[:limit]
-
-    # 4. Fallback: recommend any products (even if swiped)
-    filter_where, filter_params = build_filters(None, color, location, min_price, max_price)
-    sql = f"""
-    SELECT p.id, p.name, p.price, p.image, p.category, p.color, p.location, p.price_num
-    FROM products p
-    {filter_where}
-    """
-    cur.execute(sql, filter_params)
-    for row in cur.fetchall():
-        if row['id'] not in used_ids:
-            result.append(dict(row))
-            used_ids.add(row['id'])
-        if len(result) >= limit:
-            return result[:limit]
-
-    # If still empty, re-roll: return a random sample of products (including already swiped/used ones)
-    cur.execute('SELECT id, name, price, image, category, color, location, price_num FROM products ORDER BY RANDOM() LIMIT ?', (limit,))
+        snap = catalog.get()
+        want = limit * 5
+        mask = None
+        if category or color or location or min_price is not None or max_price is not None:
+            mask = snap.mask(category=category, color=color, location=location, min_price=min_price, max_price=max_price)
+        candidates = snap.ids[mask] if mask is not None else None
+        ranked = []
+        if candidates is not None and len(candidates) <= ANON_CANDIDATE_LIMIT:
+            if len(candidates):
+                placeholders = ','.join('?' * len(candidates))
+                cur.execute(f'SELECT product_id, score FROM product_scores WHERE product_id IN ({placeholders})',
+                            [int(i) for i in candidates])
+                batch = cur.fetchall()
+                random.shuffle(batch)
+                batch.sort(key=lambda r: -r[1])
+                batch = batch[:want]
+                ranked = list(zip(snap.select([r[0] for r in batch]), [r[1] for r in batch]))
+        else:
+            rows = _rotated_scores(db, random.randrange(SHUFFLE_RANGE))
+            while len(ranked) < want:
+                batch = list(islice(rows, 1000))
+                if not batch:
+                    break
+                scores = dict(batch)
+                selected = snap.select([r[0] for r in batch], mask)
+                ranked.extend((r, scores[int(snap.ids[r])]) for r in selected)
+            rows.close()
+            ranked = ranked[:want]
+        items = snap.materialize([r for r, _ in ranked])
+        for item, (_, score) in zip(items, ranked):
+            item['score'] = score
+        # keep the score order but vary equally-scored items between requests
+        random.shuffle(items)
+        items.sort(key=lambda r: -r['score'])
+        return items[:limit]
+
+    # Personalized logic. Tiers: 0 = liked category, not yet swiped; 1 = other
+    # category, not yet swiped; 2 = liked category, swiped; 3 = anything else.
+    # Within a tier, categories the user liked more come first, then catalog
+    # order. Liked categories are streamed from the inferred_category index
+    # (categories with equal like counts merged by id) and the rest of the
+    # catalog in id order, so a page usually costs about `limit` rows. Filters
+    # that leave only a few candidates in the catalog snapshot are ranked in
+    # memory instead (a stream would read past everything they exclude).
+    clauses, params = Search.build_filters(color, location, min_price, max_price)
+    cur.execute('''SELECT p.inferred_category, COUNT(*) FROM swipes s JOIN products p ON s.item_id = p.id
+                   WHERE s.user_id = ? AND s.action = 'like' AND p.inferred_category IS NOT NULL
+                   GROUP BY p.inferred_category''', (user_id,))
+    liked = dict(cur.fetchall())
+    if category:
+        liked = {c: n for c, n in liked.items() if c == category}
+    cur.execute('SELECT DISTINCT item_id FROM swipes WHERE user_id = ?', (user_id,))
+    swiped = {r[0] for r in cur.fetchall()}
+    if category or color or location or min_price is not None or max_price is not None:
+        snap = catalog.get()
+        rows = np.flatnonzero(snap.mask(category=category, color=color, location=location,
+                                        min_price=min_price, max_price=max_price))
+        if len(rows) <= ANON_CANDIDATE_LIMIT:
+            cats = snap.encoded['inferred_category']
+
+            def rank(r):
+                pid, cat = int(snap.ids[r]), cats[r]
+                return (pid in swiped) * 2 + (cat not in liked), -liked.get(cat, 0), pid
+            return snap.materialize(sorted(rows, key=rank)[:limit]) or _random_products(cur, limit)
+    items = []
+
+    def fill(rows):
+        for r in rows:
+            if r['id'] not in swiped:
+                items.append(dict(r))
+                if len(items) >= limit:
+                    return True
+        return False
+
+    done = False
+    by_count = {}
+    for c, n in liked.items():
+        by_count.setdefault(n, []).append(c)
+    for n in sorted(by_count, reverse=True):
+        streams = [Products.iter_category(db, c, clauses, params, columns=RECOMMENDATION_COLUMNS)
+                   for c in sorted(by_count[n])]
+        if fill(heapq.merge(*streams, key=lambda r: r['id'])):
+            done = True
+            break
+    if not done:
+        other = list(clauses)
+        other_params = list(params)
+        if category:
+            other.append('p.inferred_category = ?')
+            other_params.append(category)
+        if liked:
+            other.append(f"(p.inferred_category IS NULL OR p.inferred_category NOT IN ({','.join('?' * len(liked))}))")
+            other_params.extend(liked)
+        done = fill(Products.iter_products(db, other, other_params, columns=RECOMMENDATION_COLUMNS))
+    if not done and swiped:
+        # the swiped tiers only ever hold the user's own swipes
+        ids = sorted(swiped)
+        seen = []
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            extra = ['p.inferred_category = ?'] if category else []
+            sql = (f"SELECT {RECOMMENDATION_COLUMNS} FROM products p WHERE p.id IN ({','.join('?' * len(chunk))})"
+                   + ''.join(' AND ' + c for c in clauses + extra))
+            seen.extend(dict(r) for r in db.execute(sql, chunk + list(params) + ([category] if category else [])))
+        seen.sort(key=lambda r: (r['inferred_category'] not in liked, -liked.get(r['inferred_category'], 0), r['id']))
+        items.extend(seen[:limit - len(items)])
+    return items or _random_products(cur, limit)
+
+
+def _random_products(cur, limit):
+    # If nothing matches the filters, re-roll: return a random sample of products
+    cur.execute(f'SELECT {RECOMMENDATION_COLUMNS} FROM products p ORDER BY RANDOM() LIMIT ?', (limit,))
     rows = cur.fetchall()
     return [dict(r) for r in rows]
 
-    # Always return at least some products (never empty)
-    # return result[:limit] if result else []
-
 @app.route('/recommendations')
 def recommendations():
     user_id = request.args.get('user_id')
@@ -411,16 +504,16 @@ def recommendations():
 
 
 @app.route('/categories')
+@cached_response('catalog')
 def categories():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute("SELECT DISTINCT category FROM products WHERE category IS NOT NULL AND category <> '' ORDER BY category")
-    rows = cur.fetchall()
-    cats = [r['category'] for r in rows]
-    return jsonify({"categories": cats})
+    return jsonify({"categories": Products.list_categories(get_read_db())})
+
+
+SEARCH_MAX_K = 100
 
 
 @app.route('/search')
+@cached_response('catalog')
 def search():
     q = (request.args.get('q') or '').strip()
     color = request.args.get('color')
@@ -434,102 +527,291 @@ def search():
     except Exception:
         max_price = None
 
-    db = get_db()
-    cur = db.cursor()
-    clauses = []
-    params = []
-    if q:
-        clauses.append("(name LIKE ? OR category LIKE ? OR color LIKE ? OR location LIKE ?)")
-        like_q = f"%{q}%"
-        params.extend([like_q, like_q, like_q, like_q])
-    if color:
-        clauses.append('color = ?')
-        params.append(color)
-    if location:
-        clauses.append('location = ?')
-        params.append(location)
-    if min_price is not None:
-        clauses.append('price_num >= ?')
-        params.append(min_price)
-    if max_price is not None:
-        clauses.append('price_num <= ?')
-        params.append(max_price)
-
-    where = ('WHERE ' + ' AND '.join(clauses)) if clauses else ''
-    sql = f"SELECT id, name, price, image, category, color, location, price_num FROM products {where} LIMIT 50"
-    cur.execute(sql, tuple(params))
-    rows = cur.fetchall()
-    items = [dict(r) for r in rows]
-    return jsonify({"items": items})
+    k = page_size(request.args.get('k'), 50, SEARCH_MAX_K)
+    try:
+        state = decode_cursor(request.args.get('cursor'))
+        db = get_read_db()
+        if not q:
+            items, next_state = Search.snapshot_search(catalog.get(), color=color, location=location, min_price=min_price,
+                                                       max_price=max_price, limit=k, cursor=state)
+        elif Search.has_search_index(db):
+            items, next_state = Search.search_products(db, q, color=color, location=location, min_price=min_price,
+                                                       max_price=max_price, limit=k, cursor=state)
+        else:
+            items, next_state = Search.like_search(db, q, color=color, location=location, min_price=min_price,
+                                                   max_price=max_price, limit=k, cursor=state)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": items, "k": k, "next_cursor": encode_cursor(next_state) if next_state else None})
+
+
+# /similar computes the category page inline (a mask over the catalog
+# snapshot), then runs the image and NLP branches concurrently when the page
+# still has room. Each model branch has its own bounded pool and deadline;
+# whatever finished in time is returned, and a branch that overruns keeps
+# running in its pool but is left out of the response. A branch whose pool has
+# no free worker (all stuck on slow downloads or encodes) is skipped as
+# 'busy' rather than queued behind them.
+SIMILAR_DEADLINES = {
+    'image': float(os.getenv('SIMILAR_IMAGE_DEADLINE_MS', '2000')) / 1000,
+    'nlp': float(os.getenv('SIMILAR_NLP_DEADLINE_MS', '750')) / 1000,
+}
+
+
+class BoundedPool:
+    """Thread pool that refuses work instead of queueing it when every worker is busy."""
+
+    def __init__(self, workers, name):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def try_submit(self, fn, *args):
+        """Submit ``fn(*args)`` if a worker is free, else return None."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            fut = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        return fut
+
+
+_similar_pools = {branch: BoundedPool(int(os.getenv('SIMILAR_WORKERS', '4')), f'similar-{branch}')
+                  for branch in SIMILAR_DEADLINES}
+
+
+def _similar_category_ids(snap, category, product_id, after_id, limit):
+    mask = snap.mask(category=category) & (snap.ids != int(product_id)) & (snap.ids > after_id)
+    return [int(i) for i in snap.ids[mask][:limit]]
+
+
+def _similar_image_ids(image_based_recommendation, image_url, top_k):
+    recs = image_based_recommendation.recommend_from_image(image_url, top_k=top_k)
+    return [r.get('product_id') for r in recs if r.get('product_id')]
+
+
+def _nlp_generation():
+    # a re-index swaps embeddings without a catalog change; key /similar on it
+    nlp = nlp_model.get()
+    if nlp is None:
+        return None
+    nlp.refresh()
+    return nlp.generation
+
+
+def _similar_nlp_ids(nlp, query_text, top_k):
+    return [r.get('id') or r.get('product_id') for r in nlp.nlp_recommend(query_text, top_k=top_k)]
+
+
+def _similar_filter(snap, category, product_id):
+    """Filter for model hits: known products outside ``category``, minus the source product."""
+    keep_mask = ~snap.mask(category=category) if category else None
+    exclude = int(product_id) if product_id else None
+
+    def keep(ids):
+        ids = [i for i in ids if i]
+        kept = snap.ids[snap.select(ids, keep_mask)]
+        return [int(i) for i in dict.fromkeys(kept.tolist()) if i != exclude]
+    return keep
+
+
+def _fetch_filtered(fetch, args, need, keep):
+    """Call ``fetch(*args, top_k)`` with a top_k grown from the share of hits
+    that survive ``keep`` until ``need`` survive, the source runs out, or
+    SIMILAR_MAX_FETCH is reached."""
+    top_k = need * 2
+    while True:
+        raw = fetch(*args, top_k)
+        kept = keep(raw)
+        if len(kept) >= need or len(raw) < top_k or top_k >= SIMILAR_MAX_FETCH:
+            return kept[:need]
+        # scale by the observed keep ratio, at least doubling
+        estimate = top_k * need * 5 // (4 * max(len(kept), 1)) + 1
+        top_k = min(max(top_k * 2, estimate), SIMILAR_MAX_FETCH)
+
+
+def _timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _collect(futures, started, meta, timings):
+    results = {}
+    for branch, fut in futures.items():
+        remaining = SIMILAR_DEADLINES[branch] - (time.perf_counter() - started)
+        try:
+            ids, ms = fut.result(timeout=max(remaining, 0))
+            results[branch] = ids
+            meta[branch] = {'status': 'ok', 'count': len(ids)}
+            timings[branch] = ms
+        except FuturesTimeout:
+            meta[branch] = {'status': 'timeout'}
+            timings[branch] = (time.perf_counter() - started) * 1000
+        except Exception as e:
+            print(f'{branch} recommender error in /similar:', e)
+            meta[branch] = {'status': 'error', 'message': str(e)}
+    return results
+
+
+# Pages walk the category (keyset on id) first, then the image and NLP results
+# interleaved. Those are a ranked list rather than a table, so their cursor is
+# a position in it, bounded by SIMILAR_MAX_RESULTS.
+SIMILAR_MAX_K = 50
+SIMILAR_MAX_RESULTS = int(os.getenv('SIMILAR_MAX_RESULTS', '200'))
+# most hits asked of one model branch while looking for enough outside the
+# source product's category
+SIMILAR_MAX_FETCH = int(os.getenv('SIMILAR_MAX_FETCH', '2000'))
 
 
 @app.route('/similar')
+@cached_response('catalog', extra=lambda: (image_model.state, nlp_model.state, _nlp_generation()))
 def similar():
-    # expect ?product_id=123 or ?image_url=...
+    # expect ?product_id=123 or ?image_url=..., plus optional k and cursor
     product_id = request.args.get('product_id')
     image_url = request.args.get('image_url')
-    top_k = int(request.args.get('k') or 6)
-    db = get_db()
+    top_k = page_size(request.args.get('k'), 6, SIMILAR_MAX_K)
+    try:
+        state = decode_cursor(request.args.get('cursor')) or {}
+        try:
+            after_id = int(state.get('after', 0))
+            offset = int(state.get('offset', 0))
+        except (TypeError, ValueError):
+            raise InvalidCursor('invalid cursor position')
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    db = get_read_db()
     cur = db.cursor()
     category = None
+    name = None
     if product_id:
-        cur.execute('SELECT image, category FROM products WHERE id = ?', (product_id,))
+        cur.execute('SELECT name, image, category, inferred_category FROM products WHERE id = ?', (product_id,))
         row = cur.fetchone()
         if not row:
-            return jsonify({"items": []})
+            return jsonify({"items": [], "k": top_k, "next_cursor": None})
         image_url = row['image']
-        category = row['category']
+        category = row['inferred_category']
+        name = row['name']
+        source_category = row['category']
     if not image_url:
-        return jsonify({"items": []})
+        return jsonify({"items": [], "k": top_k, "next_cursor": None})
 
-    # 1. Category-based recommendations (excluding current product)
-    category_recs = []
-    if category:
-        cur.execute('SELECT id, name, price, image, category FROM products WHERE category = ? AND id != ?', (category, product_id))
-        category_recs = [dict(r) for r in cur.fetchall()]
-    used_ids = set([int(product_id)]) if product_id else set()
-    for r in category_recs:
-        used_ids.add(r['id'])
-
-    # 2. Image-based recommendations (excluding already included)
-    image_recs = []
-    if image_based_recommendation is not None:
-        try:
-            recs = image_based_recommendation.recommend_from_image(image_url, top_k=top_k)
-            for r in recs:
-                pid = r.get('product_id')
-                if pid and pid not in used_ids:
-                    cur.execute('SELECT id, name, price, image, category FROM products WHERE id = ?', (pid,))
-                    prow = cur.fetchone()
-                    if prow:
-                        image_recs.append(dict(prow))
-                        used_ids.add(pid)
-        except Exception as e:
-            print('image recommender error in /similar:', e)
+    snap = catalog.get()
+    started = time.perf_counter()
+    meta = {}
+    # per-request times go to the Server-Timing header, not the (cached) body
+    timings = {}
+    phase = state.get('phase', 'category' if category else 'model')
+    # 1. Category-based recommendations (excluding current product); one
+    # extra row tells us whether the category has another page
+    category_ids = []
+    if phase == 'category' and category:
+        category_ids, timings['category'] = _timed(_similar_category_ids, snap, category, product_id, after_id,
+                                                   top_k + 1)
+        meta['category'] = {'status': 'ok', 'count': len(category_ids)}
+    else:
+        meta['category'] = {'status': 'skipped'}
+    if len(category_ids) > top_k:
+        next_state = {'phase': 'category', 'after': category_ids[top_k - 1]}
+        ordered = category_ids[:top_k]
+        model_ids = []
+        meta['image'] = meta['nlp'] = {'status': 'skipped'}
+    else:
+        if phase == 'category':
+            offset = 0
+        # 2./3. Image- and NLP-based recommendations, run concurrently. Each
+        # branch keeps fetching until it has `need` hits outside the source
+        # product's category (or runs out), so it alone could fill the page.
+        need = min(offset + top_k - len(category_ids) + 1, SIMILAR_MAX_RESULTS)
+        keep = _similar_filter(snap, category, product_id)
+        futures = {}
+        image_based_recommendation = image_model.get()
+        if image_based_recommendation is not None:
+            futures['image'] = _similar_pools['image'].try_submit(
+                _timed, _fetch_filtered, _similar_image_ids, (image_based_recommendation, image_url), need, keep)
+        else:
+            meta['image'] = {'status': 'unavailable'}
+        _nlp = nlp_model.get()
+        if _nlp is not None and product_id:
+            query_text = f"{name} {source_category or ''}"
+            futures['nlp'] = _similar_pools['nlp'].try_submit(
+                _timed, _fetch_filtered, _similar_nlp_ids, (_nlp, query_text), need, keep)
+        else:
+            meta['nlp'] = {'status': 'unavailable' if _nlp is None else 'skipped'}
+        for branch in [b for b, fut in futures.items() if fut is None]:
+            meta[branch] = {'status': 'busy'}
+            del futures[branch]
+        branch_ids = _collect(futures, started, meta, timings)
+        # alternate image and NLP hits so both show up on every page
+        used_ids = set()
+        model_ids = []
+        for pair in zip_longest(branch_ids.get('image', []), branch_ids.get('nlp', [])):
+            for pid in pair:
+                if pid is not None and pid not in used_ids:
+                    used_ids.add(pid)
+                    model_ids.append(pid)
+        model_ids = model_ids[:SIMILAR_MAX_RESULTS]
+        ordered = category_ids
 
-    # 3. NLP-based recommendations (excluding already included)
-    nlp_recs = []
-    if _nlp is not None and product_id:
-        try:
-            cur.execute('SELECT name, category FROM products WHERE id = ?', (product_id,))
-            prow = cur.fetchone()
-            if prow:
-                query_text = f"{prow['name']} {prow.get('category','')}"
-                nlp_results = _nlp.nlp_recommend(query_text, top_k=top_k)
-                for r in nlp_results:
-                    pid = r.get('id') or r.get('product_id')
-                    if pid and pid not in used_ids:
-                        cur.execute('SELECT id, name, price, image, category FROM products WHERE id = ?', (pid,))
-                        prow2 = cur.fetchone()
-                        if prow2:
-                            nlp_recs.append(dict(prow2))
-                            used_ids.add(pid)
-        except Exception as e:
-            print('nlp recommender error in /similar:', e)
+    # Hydrate the page from the catalog snapshot
+    if model_ids:
+        page_ids = model_ids[offset:offset + top_k - len(ordered)]
+        end = offset + len(page_ids)
+        next_state = {'phase': 'model', 'offset': end} if len(model_ids) > end else None
+    else:
+        page_ids = []
+    rows = {r['id']: r for r in snap.materialize(snap.rows_for(ordered + page_ids))}
+    combined = [rows[pid] for pid in ordered + page_ids if pid in rows]
+    if not model_ids and len(category_ids) <= top_k:
+        next_state = None
+    timings['total'] = (time.perf_counter() - started) * 1000
+    resp = jsonify({"items": combined, "k": top_k,
+                    "next_cursor": encode_cursor(next_state) if next_state else None, "meta": meta})
+    resp.headers['Server-Timing'] = ', '.join(f'{name};dur={ms:.2f}' for name, ms in timings.items())
+    # a page missing a branch that timed out, errored or was busy is served
+    # but not cached, so it is recomputed once the models catch up
+    if any(m['status'] not in ('ok', 'skipped') for m in meta.values()):
+        resp.headers['Cache-Control'] = 'no-store'
+    return resp
+
+
+# Follow-up image recommendations computed after a swipe is committed, kept
+# per user until their next /swipe (or GET /swipe/recommendations) picks them up
+_followups = LRUCache(maxsize=10000)
+_followup_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='swipe-followup')
+
+
+def _compute_followups(user_id, item_id, item_image):
+    image_based_recommendation = image_model.get()
+    if image_based_recommendation is None:
+        return
+    try:
+        recs = image_based_recommendation.recommend_from_image(item_image, top_k=6)
+        ids = [r['product_id'] for r in recs if r.get('product_id') and r.get('product_id') != item_id][:5]
+        if not ids:
+            return
+        with Database.readers.connection() as conn:
+            placeholders = ','.join('?' * len(ids))
+            rows = {r['id']: dict(r) for r in conn.execute(
+                f'SELECT id, name, price, image, category FROM products WHERE id IN ({placeholders})', ids)}
+        _followups.put(user_id, [rows[i] for i in ids if i in rows])
+    except Exception as e:
+        print('swipe follow-up error', e)
+
+
+def _after_swipe_batch(batch):
+    # only the latest like per user matters for the next card stack
+    latest = {}
+    for e in batch:
+        if e['action'] == 'like' and e.get('user_id') and e.get('item_image'):
+            latest[e['user_id']] = e
+    for e in latest.values():
+        _followup_pool.submit(_compute_followups, e['user_id'], e['item_id'], e['item_image'])
 
-    # Combine all recommendations in order: category, image, nlp
-    combined = category_recs + image_recs + nlp_recs
-    return jsonify({"items": combined})
+
+swipe_writer = SwipeWriter(DB_PATH, on_batch=_after_swipe_batch)
 
 
 @app.route('/swipe', methods=['POST'])
@@ -544,28 +826,60 @@ def swipe():
     user_id = data.get('user_id')
     if action not in ('like','dislike') or item_id is None:
         return jsonify({"error":"invalid payload"}), 400
-    recs = recommend_from_image(item_image, top_k=5) if image_based_recommendation is not None and item_image else ([],[])
-    combined=[]
+    try:
+        item_id = int(item_id)
+    except (TypeError, ValueError):
+        return jsonify({"error":"invalid payload"}), 400
+    event = {'item_id': item_id, 'action': action, 'user_id': user_id, 'item_image': item_image}
+    if not swipe_writer.submit(event):
+        return jsonify({"error":"busy","message":"swipe queue is full"}), 503
+    # recommendations computed from this user's earlier likes, if any are ready
+    recs = _followups.pop(user_id, []) if user_id else []
+    if user_id:
+        Metrics.cache_lookup('followups', bool(recs))
     return jsonify({"status":"ok","recommendations": recs})
 
 
+@app.route('/swipe/recommendations')
+def swipe_recommendations():
+    """Return (and consume) follow-up recommendations computed after the user's last like."""
+    user_id = request.args.get('user_id')
+    recs = _followups.pop(user_id, []) if user_id else []
+    return jsonify({"items": recs})
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once every model has finished loading (or failed and
+    been disabled), 503 while any is still loading. SQL-only endpoints work
+    either way."""
+    models = {"image": image_model.status(), "nlp": nlp_model.status()}
+    for m in (image_model, nlp_model):
+        if m.state == 'cold':
+            m.start_background()
+    settled = all(m['state'] in ('ready', 'failed') for m in models.values())
+    degraded = any(m['state'] == 'failed' for m in models.values())
+    body = {"ready": settled, "degraded": degraded, "models": models}
+    return jsonify(body), (200 if settled else 503)
+
+
 @app.route('/admin/extract_features', methods=['POST'])
 def admin_extract_features():
-    """Admin endpoint to synchronously extract image features from products DB.
+    """Admin endpoint to extract image features from products DB in the background.
     Use after installing heavy deps (tensorflow, pillow, sklearn, pandas).
+    ``{"retry_failed": true}`` (or ``?retry_failed=1``) also retries images
+    listed in failed_images.json. Returns 409 while a run is in progress in
+    any worker.
     """
-    if image_based_recommendation is None:
-        return jsonify({"error":"image_recommender_unavailable"}), 503
+    if image_model.state == 'failed':
+        return jsonify({"error":"image_recommender_unavailable", "message": image_model.error}), 503
+    data = request.get_json(silent=True) or {}
+    retry_failed = bool(data.get('retry_failed')) or request.args.get('retry_failed') in ('1', 'true', 'True')
     try:
-        # If image recommender available, start extraction in background (non-blocking)
-        def run_extract():
-            try:
-                image_based_recommendation.extract_all_features_from_db()
-            except Exception as ee:
-                print('background extract error', ee)
-        t = threading.Thread(target=run_extract, daemon=True)
-        t.start()
-        return jsonify({"status":"started"})
+        from Models import image_based_recommendation
+        if not image_based_recommendation.start_extraction(retry_failed=retry_failed):
+            return jsonify({"status":"running", "progress": image_based_recommendation.extraction_progress()}), 409
+        return jsonify({"status":"started", "retry_failed": retry_failed})
     except Exception as e:
         print('admin extract error', e)
         return jsonify({"error":"extract_failed","message": str(e)}), 500
@@ -573,17 +887,40 @@ def admin_extract_features():
 
 @app.route('/admin/generate_nlp', methods=['POST'])
 def admin_generate_nlp():
-    """Admin endpoint to (re)generate NLP embeddings using sentence-transformers.
+    """Admin endpoint to re-index the NLP embeddings in the background.
+    Only new and changed products are encoded; the current index keeps serving
+    until the new one is swapped in, and other workers pick it up from the
+    store's manifest. Progress is at /admin/nlp_progress.
     """
-    global _nlp
-    if _nlp is None:
+    if nlp_model.state == 'failed':
+        return jsonify({"error":"nlp_unavailable","message": nlp_model.error}), 503
+    nlp = nlp_model.get()
+    if nlp is None:
+        # the first load syncs the store itself
+        return jsonify({"status":"loading", "model": nlp_model.status()}), 202
+    from Models import nlp_recommender
+    if not nlp_recommender.start_reindex(nlp):
+        return jsonify({"status":"running", "progress": nlp_recommender.read_progress()}), 409
+    return jsonify({"status":"started"})
+
+
+@app.route('/admin/nlp_progress')
+def admin_nlp_progress():
+    """Progress of the last NLP re-index job, plus the generation this worker serves."""
+    prog_path = BASE_DIR / 'Models' / 'nlp_progress.json'
+    data = {"status":"idle"}
+    if prog_path.exists():
         try:
-            from Models.nlp_recommender import NLPRecommender
-            _nlp = NLPRecommender()
+            import json
+            with open(prog_path, 'r') as f:
+                data = json.load(f)
         except Exception as e:
-            print('admin nlp error', e)
-            return jsonify({"error":"nlp_unavailable","message": str(e)}), 503
-    return jsonify({"status":"ok"})
+            print('progress read error', e)
+            data = {"status":"unknown"}
+    nlp = nlp_model.get()
+    data["serving"] = {"pid": os.getpid(), "model": nlp_model.state,
+                       "generation": nlp.generation if nlp is not None else None}
+    return jsonify(data)
 
 
 @app.route('/admin/extract_progress')
@@ -601,6 +938,74 @@ def admin_extract_progress():
         print('progress read error', e)
         return jsonify({"status":"unknown"}), 500
 
+@app.route('/admin/cache_stats')
+def admin_cache_stats():
+    """Return hit/miss counters of the response cache and the image and NLP
+    query-embedding caches. A model that is not loaded is reported as
+    unavailable instead of failing the whole response."""
+    body = {"responses": response_cache.snapshot()}
+    image_based_recommendation = image_model.get()
+    if image_based_recommendation is None:
+        body["query_embeddings"] = {"status": "unavailable", "model": image_model.status()}
+    else:
+        body["query_embeddings"] = image_based_recommendation.query_cache_stats()
+    nlp = nlp_model.get()
+    if nlp is None:
+        body["nlp_queries"] = {"status": "unavailable", "model": nlp_model.status()}
+    else:
+        lookups = nlp.query_cache_hits + nlp.query_cache_misses
+        body["nlp_queries"] = {"hits": nlp.query_cache_hits, "misses": nlp.query_cache_misses,
+                               "hit_rate": (nlp.query_cache_hits / lookups) if lookups else 0.0}
+    return jsonify(body)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's latency histograms and counters."""
+    return Response(Metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Arm (POST {requests, rate, seconds}), stop (POST {stop: true}) or inspect the
+    sampled request profiler. Each sampled request is dumped to PROFILE_DIR as a
+    .prof file for pstats/snakeviz/flamegraph tools."""
+    if request.method == 'GET':
+        return jsonify(profiler.status())
+    data = request.get_json(silent=True) or {}
+    if data.get('stop'):
+        return jsonify(profiler.stop())
+    try:
+        requests_n = int(data.get('requests', 50))
+        rate = float(data.get('rate', 1.0))
+        seconds = float(data.get('seconds', 300))
+    except (TypeError, ValueError):
+        return jsonify({"error": "requests, rate and seconds must be numbers"}), 400
+    if requests_n <= 0 or not 0 < rate <= 1 or seconds <= 0:
+        return jsonify({"error": "need requests > 0, 0 < rate <= 1 and seconds > 0"}), 400
+    return jsonify(profiler.start(requests=requests_n, rate=rate, seconds=seconds))
+
+@app.route('/admin/rebuild_scores', methods=['POST'])
+def admin_rebuild_scores():
+    """Recompute the materialized product popularity scores from swipes."""
+    count = rebuild_product_scores(get_db())
+    return jsonify({'status': 'ok', 'products': count})
+
+
+@app.cli.command('rebuild-scores')
+def rebuild_scores_command():
+    """Recompute product_scores from the swipes table."""
+    count = rebuild_product_scores(get_db())
+    print(f'Rebuilt scores for {count} products')
+
+@app.cli.command('import-catalog')
+@click.argument('files', nargs=-1)
+@click.option('--workers', type=int, default=None, help='Parser processes (default: one per file, up to CPU count).')
+@click.option('--force', is_flag=True, help='Re-import files even if their content hash is unchanged.')
+def import_catalog_command(files, workers, force):
+    """Import retailer CSVs from backend/Datasets into products."""
+    init_db()
+    CatalogImport.import_catalog(get_db(), BASE_DIR / 'Datasets', files=files, workers=workers, force=force)
+
+
 @app.route('/admin/reset_db', methods=['POST'])
 def admin_reset_db():
     """Dangerous: Drop all tables and re-initialize the database."""
@@ -616,6 +1021,9 @@ def admin_reset_db():
     db.commit()
     # Re-initialize
     init_db()
+    catalog.refresh()
+    response_cache.clear()
+    catalog_versions.invalidate()
     return jsonify({'status': 'ok', 'message': 'Database reset and re-initialized.'})
 
 @app.route('/create_user', methods=['POST'])
@@ -636,41 +1044,19 @@ def create_user():
 
 @app.route('/users', methods=['GET'])
 def list_users():
-    db = get_db()
+    db = get_read_db()
     cur = db.cursor()
     cur.execute('SELECT id, name FROM users ORDER BY created_at DESC')
     users = [dict(row) for row in cur.fetchall()]
     return jsonify({'users': users})
 
 # Gender categorization utility
-GENDER_KEYWORDS = {
-    'male': ['men', 'man', 'male', 'boy', 'guys', 'gentlemen', 'mens', 'boys'],
-    'female': ['women', 'woman', 'female', 'girl', 'ladies', 'womens', 'girls', 'lady'],
-}
-def infer_gender(text):
-    if not text:
-        return 'unknown'
-    t = text.lower()
-    for gender, keywords in GENDER_KEYWORDS.items():
-        for kw in keywords:
-            if kw in t:
-                return gender
-    return 'unknown'
-
 @app.route('/admin/categorize_gender', methods=['POST'])
 def admin_categorize_gender():
-    db = get_db()
-    cur = db.cursor()
-    cur.execute('SELECT id, name, category FROM products')
-    products = cur.fetchall()
-    updated = 0
-    for p in products:
-        text = f"{p['name']} {p['category']}"
-        gender = infer_gender(text)
-        cur.execute('UPDATE products SET gender = ? WHERE id = ?', (gender, p['id']))
-        updated += 1
-    db.commit()
-    return jsonify({'status': 'ok', 'updated': updated})
+    """Re-tag every product's inferred category and gender (e.g. after the
+    keyword tables in Utilities/Tagging.py changed)."""
+    stats = Tagging.tag_products(get_db(), force=True)
+    return jsonify({'status': 'ok', 'updated': stats['updated'], 'scanned': stats['scanned']})
 
 if __name__ == '__main__':
     # ensure DB folder exists
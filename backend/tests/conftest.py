@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the backend modules (app, Models, Utilities, Benchmarks) import each other
+# from backend/, so put it first on the path wherever pytest is started
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
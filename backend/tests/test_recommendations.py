@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+import pytest
+
+_tmp = tempfile.mkdtemp()
+os.environ['APP_DB_PATH'] = os.path.join(_tmp, 'app.db')
+os.environ.setdefault('WARMUP_MODELS', '0')
+
+import app  # noqa: E402
+from Benchmarks import synthetic  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def client():
+    with app.app.app_context():
+        app.init_db()
+    synthetic.populate(os.environ['APP_DB_PATH'], 3000, n_users=10, n_swipes=0, log=lambda *a, **k: None)
+    yield app.app.test_client()
+    app.swipe_writer.drain()
+
+
+def test_anonymous_feed_varies_within_tied_scores(client):
+    # no swipes yet: every product has score 0, one tie group
+    seen = set()
+    for _ in range(200):
+        resp = client.get('/recommendations')
+        assert resp.status_code == 200
+        seen.update(item['id'] for item in resp.get_json()['items'])
+    assert len(seen) > 1000
+
+
+def test_anonymous_feed_keeps_score_order(client):
+    with app.app.app_context():
+        db = app.get_db()
+        top = [r[0] for r in db.execute('SELECT id FROM products ORDER BY id LIMIT 3')]
+        for pid in top:
+            db.execute("INSERT INTO swipes(user_id, item_id, action) VALUES ('u-test', ?, 'like')", (pid,))
+        db.commit()
+    for _ in range(20):
+        items = client.get('/recommendations').get_json()['items']
+        assert sorted(item['id'] for item in items[:3]) == top
+        scores = [item['score'] for item in items]
+        assert scores == sorted(scores, reverse=True)
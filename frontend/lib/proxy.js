@@ -0,0 +1,12 @@
+// Proxy a GET to the backend, forwarding If-None-Match so an unchanged
+// response comes back as a 304, and passing the backend's ETag through.
+export async function proxyConditional(req, res, url){
+  const headers = {}
+  if(req.headers['if-none-match']) headers['if-none-match'] = req.headers['if-none-match']
+  const r = await fetch(url, { headers })
+  const etag = r.headers.get('etag')
+  if(etag) res.setHeader('ETag', etag)
+  if(r.status === 304) return res.status(304).end()
+  const data = await r.json()
+  return res.status(r.status).json(data)
+}
@@ -1,9 +1,9 @@
+import { proxyConditional } from '../../lib/proxy'
+
 export default async function handler(req, res){
   const backend = process.env.BACKEND_URL || 'http://localhost:5001'
   try{
-    const r = await fetch(`${backend}/categories`)
-    const data = await r.json()
-    return res.status(r.status).json(data)
+    return await proxyConditional(req, res, `${backend}/categories`)
   }catch(err){
     console.error('Error proxying /categories to backend', err)
     const message = err && err.message ? err.message : String(err)
@@ -1,3 +1,5 @@
+import { proxyConditional } from '../../lib/proxy'
+
 export default async function handler(req, res){
   // prefer explicit addresses to avoid localhost/IPv6 issues. Allow BACKEND_URL env
   // to override. If not set, try 127.0.0.1 then the LAN IP observed on dev machine.
@@ -11,9 +13,7 @@ export default async function handler(req, res){
   if(req.query.min_price) qs.set('min_price', req.query.min_price)
   if(req.query.max_price) qs.set('max_price', req.query.max_price)
     const url = `${backend}/recommendations${qs.toString() ? '?'+qs.toString() : ''}`
-    const r = await fetch(url)
-    const data = await r.json()
-    return res.status(r.status).json(data)
+    return await proxyConditional(req, res, url)
   }catch(err){
     console.error('Error proxying /recommendations to backend', err)
     const message = err && err.message ? err.message : String(err)
@@ -1,3 +1,5 @@
+import { proxyConditional } from '../../lib/proxy'
+
 export default async function handler(req, res){
   const backend = process.env.BACKEND_URL || 'http://localhost:5001'
   try{
@@ -7,10 +9,10 @@ export default async function handler(req, res){
     if(req.query.location) qs.set('location', req.query.location)
     if(req.query.min_price) qs.set('min_price', req.query.min_price)
     if(req.query.max_price) qs.set('max_price', req.query.max_price)
+    if(req.query.k) qs.set('k', req.query.k)
+    if(req.query.cursor) qs.set('cursor', req.query.cursor)
     const url = `${backend}/search${qs.toString() ? '?'+qs.toString() : ''}`
-    const r = await fetch(url)
-    const data = await r.json()
-    return res.status(r.status).json(data)
+    return await proxyConditional(req, res, url)
   }catch(err){
     console.error('Error proxying /search to backend', err)
     const message = err && err.message ? err.message : String(err)
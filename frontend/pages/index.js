@@ -203,7 +203,7 @@ export default function Home(){
     if(!searchQuery) return setSearchResults([])
     setSearchLoading(true)
     try{
-  const res = await fetch(`${BACKEND}/search?q=${encodeURIComponent(searchQuery)}&color=${encodeURIComponent(colorFilter||'')}&location=${encodeURIComponent(locationFilter||'')}`)
+  const res = await fetch(`${BACKEND}/search?q=${encodeURIComponent(searchQuery)}&color=${encodeURIComponent(colorFilter||'')}&location=${encodeURIComponent(locationFilter||'')}&k=24`)
       const data = await res.json()
       setSearchResults(Array.isArray(data.items)? data.items : [])
     }catch(e){